@@ -1,7 +1,63 @@
+import os
+
 @property
 def desktopSize():
     return _desktopSize
 
 @desktopSize.setter
 def desktopSize(value):
-    _desktopSize = value
\ No newline at end of file
+    _desktopSize = value
+
+# Organizer scheduler: metadata parsing processes (None uses one per core),
+# file placement threads and pictures parsed per process pool task
+parseWorkers = None
+copyWorkers = 4
+parseChunkSize = 64
+
+# Minimum seconds between two organizer progress updates of the UI
+progressInterval = 0.2
+
+# SQLite cache of parsed picture metadata, see lib/metadataindex.py
+metadataIndexPath = os.path.join(os.path.expanduser("~"), ".image-manager", "metadata.sqlite")
+
+# Parallel directory walker: threads and concurrent listings per device
+scanWorkers = 8
+scanDeviceLimit = 4
+
+# Organizer pipeline: capacity of the queues between stages and seconds
+# between two throughput log lines
+pipelineQueueSize = 256
+pipelineReportInterval = 10
+
+# How pictures are placed in the organized tree: "auto" (reflink when the
+# filesystem supports it, in-kernel copy otherwise), "copy", "reflink",
+# "hardlink" or "move". Links and moves only apply on the same device.
+placementMode = "auto"
+
+# Dry-run relocation plan (JSON lines) and the copy throughput, in bytes per
+# second, used to estimate how long executing a plan takes
+relocationPlanPath = os.path.join(os.path.expanduser("~"), ".image-manager", "relocation-plan.jsonl")
+planBytesPerSecond = 100*2**20
+
+# Journals of completed relocations, one per pipeline and output tree (see
+# lib/journal.py), fsync'ed every journalSyncEvery entries, letting an
+# interrupted run skip the pictures it already placed
+journalDir = os.path.join(os.path.expanduser("~"), ".image-manager", "journals")
+journalSyncEvery = 64
+
+# Thumbnails: longest side in pixels, memory budget of the decoded images,
+# on-disk cache folder ("" disables it) and generation threads
+thumbnailSize = 160
+thumbnailMemoryBytes = 64*2**20
+thumbnailCachePath = os.path.join(os.path.expanduser("~"), ".image-manager", "thumbnails")
+thumbnailWorkers = 4
+
+# Remote pictures (see lib/remoteimage.py): bytes per ranged read, aligned,
+# and number of those blocks cached per picture
+remoteBlockSize = 64*1024
+remoteCacheBlocks = 64
+# Remote organizer (see lib/remoteorganizer.py): threads parsing metadata,
+# concurrent server-side moves and pictures per `--files-from` batch
+remoteFetchWorkers = 16
+remoteMoveWorkers = 8
+remoteBatchSize = 500
@@ -1,7 +1,6 @@
-import os, io
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib import scanner
 inputPath = input("Path to analyze:")
-directories = os.walk(inputPath)
-scanDirs = []
-for directory in directories:
-    scanDirs.append(directory[0])
-print(scanDirs)
\ No newline at end of file
+for entry in scanner.scanFiles(inputPath):
+    print(entry)
@@ -1,15 +1,40 @@
-import shutil, exif, time
-import os, re, concurrent.futures, logging
+import exif, time
+import os, re, sys, threading, logging
 from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import CommonVariables
+from lib import dedup, directories, journal, metadataindex, pipeline, placement, relocationplan, scanner
 
 logging.basicConfig(filename='example.log', level=logging.INFO)
-validExtensions = ["jpg","nef","png","tiff","dng","jpeg","raw","mp4","mov","heic"]
-threads = []
+validExtensions = scanner.IMAGE_EXTENSIONS
+indexBatch = 256
+
+placementSummary = placement.PlacementSummary()
 
 def relocate(paths):
     imagePath, newImagePath = paths
-    shutil.copy2(imagePath, newImagePath)
-    print  (f"{os.path.basename(imagePath)} relocated")
+    strategy = placement.placeFile(imagePath, newImagePath, CommonVariables.placementMode, placementSummary)
+    print  (f"{os.path.basename(imagePath)} relocated ({strategy})")
+
+def readExif(imagePath):
+    """
+    Returns the exif fields the organizer relies on, an empty dict when the
+    file holds no readable exif block
+    """
+    with open(f'{imagePath}', 'rb') as image_file:
+        try:
+            my_image = exif.Image(image_file)
+        except:
+            return {}
+        exifData = {"has_exif": my_image.has_exif}
+        if my_image.has_exif:
+            for attribute in ["datetime_original", "model", "software"]:
+                try:
+                    if hasattr(my_image, attribute):
+                        exifData[attribute] = str(getattr(my_image, attribute))
+                except:
+                    pass
+        return exifData
 
 def scanFile():
     imagePath = input("Image to analyze:")
@@ -42,8 +67,119 @@ def scanFile():
 
                 
                     
-def scanDir():
-    scanDirs = []
+class DirectoryOrganizer:
+    """
+    Stages of the scan -> parse -> copy pipeline run by scanDir. Given a
+    RelocationPlan, the last stage only writes plan entries (dry run).
+    Given a RelocationJournal, relocated pictures are journaled.
+    """
+    def __init__(self, index, outputRoot="Z:\\RELOCATED", plan=None, journal=None):
+        self.index = index
+        self.plan = plan
+        self.journal = journal
+        self.outputRoot = outputRoot
+        self.indexRows = []
+        self.lock = threading.Lock()
+        self.relocated = 0
+        self.duplicates = 0
+        self.deduplicator = dedup.Deduplicator(index)
+        self.reserved = set()
+        self.directories = directories.DirectoryPlanner()
+
+    def parse(self, entry):
+        imagePath = entry.path
+        exifData = self.index.lookup(imagePath, entry)
+        if exifData == None:
+            exifData = readExif(imagePath)
+            with self.lock:
+                self.indexRows.append(metadataindex.statKey(imagePath, entry)+(exifData,))
+                if len(self.indexRows) >= indexBatch:
+                    self.flushIndex()
+        if not exifData.get("has_exif", False):
+            return (imagePath, f"{self.outputRoot}\\NO EXIF")
+        if "datetime_original" in exifData:
+            splittedDate = re.split(r':|\s',exifData["datetime_original"])
+            try: 
+                year = splittedDate[0]
+                month = splittedDate[1]
+                day = splittedDate[2]
+                datePath = f"{year}\\{month}\\{day}"
+            except:
+                datePath = "desconocido"
+        else:
+            datePath = "desconocido"
+        if "model" in exifData:
+            return (imagePath, f"{self.outputRoot}\\{datePath}\\{exifData['model']}")
+        elif "software" in exifData:
+            return (imagePath, f"{self.outputRoot}\\{datePath}\\{exifData['software']}")
+        return (imagePath, f"{self.outputRoot}\\{datePath}\\desconocido")
+
+    def dedup(self, item):
+        imagePath = item[0]
+        original = self.deduplicator.duplicateOf(imagePath)
+        if original != None:
+            print(f"{os.path.basename(imagePath)} duplicate of {original}")
+            with self.lock:
+                self.duplicates += 1
+            if self.plan != None:
+                self.addPlanEntry(imagePath, original, "skip")
+            return None
+        return item
+
+    def destination(self, imagePath, newImageDirectoy):
+        """
+        Returns the (destination path, already relocated) pair of imagePath:
+        the picture itself when it is already there, or a free name when
+        another picture took its name.
+        """
+        name, extension = os.path.splitext(os.path.basename(imagePath))
+        suffix = 0
+        while True:
+            newImagePath = f"{newImageDirectoy}\\{name}{f'_{suffix}' if suffix else ''}{extension}"
+            with self.lock:
+                if not newImagePath in self.reserved and not os.path.exists(newImagePath):
+                    self.reserved.add(newImagePath)
+                    return (newImagePath, False)
+            if os.path.exists(newImagePath) and self.deduplicator.sameContent(imagePath, newImagePath):
+                return (newImagePath, True)
+            suffix += 1
+
+    def copy(self, item):
+        imagePath, newImageDirectoy = item
+        self.directories.ensure(newImageDirectoy)
+        newImagePath, relocated = self.destination(imagePath, newImageDirectoy)
+        if relocated:
+            print(f"{os.path.basename(imagePath)} already relocated")
+            return None
+        relocate([imagePath, newImagePath])
+        if self.journal != None:
+            self.journal.record(imagePath, newImagePath)
+        with self.lock:
+            self.relocated += 1
+        return newImagePath
+
+    def planCopy(self, item):
+        imagePath, newImageDirectoy = item
+        newImagePath, relocated = self.destination(imagePath, newImageDirectoy)
+        self.addPlanEntry(imagePath, newImagePath, "skip" if relocated else "copy")
+        return newImagePath
+
+    def addPlanEntry(self, imagePath, newImagePath, action):
+        key = metadataindex.statKey(imagePath)
+        self.plan.add(relocationplan.PlanEntry(
+            key[0], newImagePath, key[1], self.deduplicator.knownHash(key), action))
+
+    def flushIndex(self):
+        # Called with self.lock held
+        self.index.upsertMany(self.indexRows)
+        self.indexRows = []
+
+def scanDir(planPath=None):
+    """
+    Organizes the folders typed by the user, or with planPath only writes
+    the relocation plan to execute later with executePlan
+    """
+    index = metadataindex.MetadataIndex(kind=metadataindex.EXIF_SUMMARY)
     inputPaths = []
     while (True):
         inputData = input("Path to analyze (type ok when finished):")
@@ -51,110 +187,72 @@ def scanDir():
             break
         else:
             inputPaths.append(inputData)
-    
-    for inputPath in inputPaths:
-        directories = os.walk(inputPath)
-        for directory in directories:
-            if not directory[0] in scanDirs:
-                scanDirs.append(directory[0])
-    for folderPath in scanDirs:
-        started = datetime.now()
-        logging.info(f"{os.path.basename(folderPath)} started at {started}")
-        scanned,relocated = 0,0
-        for possibleImage in os.listdir(folderPath):
-            splitted = possibleImage.split(".")
-            try:
-                if len(splitted) > 1:
-                    extension = splitted[-1]
-                else:
-                    extension = "none"
-            except:
-                extension = "none"
-            if extension.lower() in validExtensions:
-                scanned += 1
-                imagePath = f"{folderPath}\\{possibleImage}"
-                with open(f'{imagePath}', 'rb') as image_file:
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-
-                        try:
-                            my_image = exif.Image(image_file)
-
-                        except:
-                            try: 
-                                newImageDirectoy = f"Z:\\RELOCATED\\NO EXIF"
-                                newImagePath = f"{newImageDirectoy}\\{os.path.basename(imagePath)}"
-                                if not os.path.exists(newImagePath):
-                                    if not os.path.exists(newImageDirectoy):
-                                        os.makedirs(newImageDirectoy)
-                                    threads.append(executor.submit(relocate, [imagePath, newImagePath]))
-                                    relocated += 1
-                                else:
-                                    print(f"{os.path.basename(imagePath)} already relocated")
-                            except:
-                                print(f"{os.path.basename(imagePath)} is invalid")
-
-                            continue
-
-                        if(my_image.has_exif):
-                            # for attribute in dir(my_image):
-                            #     if attribute[0] == "_":
-                            #         print(f"{attribute} irrelevant")
-                            #     else:
-                            #         try:
-                            #             print(f"{attribute} : {getattr(my_image,attribute)}")
-                            #         except:
-                            #             print(f"{attribute} not printable")
-                            if hasattr(my_image,"datetime_original"):
-                                splittedDate = re.split(r':|\s',my_image.datetime_original)
-                                try: 
-                                    year = splittedDate[0]
-                                    month = splittedDate[1]
-                                    day = splittedDate[2]
-                                    datePath = f"{year}\\{month}\\{day}"
-                                except:
-                                    datePath = "desconocido"
-                            else:
-                                datePath = "desconocido"
-                            try:
-                                if hasattr (my_image,"model"):
-                                    newImageDirectoy = f"Z:\\RELOCATED\\{datePath}\\{my_image.model}"
-                                elif hasattr (my_image, "software"):
-                                    newImageDirectoy = f"Z:\\RELOCATED\\{datePath}\\{my_image.software}"
-                                else:
-                                    newImageDirectoy = f"Z:\\RELOCATED\\{datePath}\\desconocido"
-                            except:
-                                newImageDirectoy = f"Z:\\RELOCATED\\{datePath}\\desconocido"
-
-                            newImagePath = f"{newImageDirectoy}\\{os.path.basename(imagePath)}"
-                            try:    
-                                if not os.path.exists(newImagePath):
-                                    if not os.path.exists(newImageDirectoy):
-                                        os.makedirs(newImageDirectoy)                
-                                    threads.append(executor.submit(relocate, [imagePath,newImagePath]))
-                                    relocated += 1
-                                else: 
-                                    print(f"{os.path.basename(imagePath)} already relocated")       
-                            except:
-                                pass
-                                #logging.error(f"Error processing {os.path.basename(imagePath)}")
-                                            # input()
-                        else:
-                            newImageDirectoy = f"Z:\\RELOCATED\\NO EXIF"
-                            newImagePath = f"{newImageDirectoy}\\{os.path.basename(imagePath)}"
-                            if not os.path.exists(newImagePath):
-                                    if not os.path.exists(newImageDirectoy):
-                                        os.makedirs(newImageDirectoy)
-                                    threads.append(executor.submit(relocate, [imagePath, newImagePath]))
-                                    relocated += 1
-                            else: 
-                                print(f"{os.path.basename(imagePath)} already relocated")     
-        logging.info(f"{os.path.basename(folderPath)} ended at {datetime.now()}, {datetime.now()-started} elapsed \
-            {scanned} files scanned, {relocated} files relocated")
+
+    started = datetime.now()
+    logging.info(f"{', '.join(inputPaths)} started at {started}")
+    plan, runJournal = None, None
+    if planPath != None:
+        plan = relocationplan.RelocationPlan(planPath)
+        plan.clear()
+        # Entries executed from the previous plan are not part of this one
+        planJournal(planPath).clear()
+    organizer = DirectoryOrganizer(index, plan=plan)
+    if plan == None:
+        # One journal per output root: a run into another tree starts afresh
+        organizer.journal = runJournal = journal.RelocationJournal(journal.pathFor("scan", organizer.outputRoot))
+    # Pictures journaled by an interrupted run are dropped before any stat or parse
+    statistics = pipeline.Pipeline(
+        (entry for entry in scanner.scanFilesParallel(inputPaths, validExtensions)
+         if runJournal == None or not runJournal.isDone(entry.path)),
+        [("parse", organizer.parse, CommonVariables.parseWorkers or os.cpu_count()),
+         ("dedup", organizer.dedup, CommonVariables.copyWorkers),
+         ("plan", organizer.planCopy, 1) if plan != None else
+         ("copy", organizer.copy, CommonVariables.copyWorkers)]).run()
+    with organizer.lock:
+        organizer.flushIndex()
+    if plan != None:
+        plan.flush()
+        estimate = plan.estimate()
+        logging.info(f"{', '.join(inputPaths)} planned at {datetime.now()}, {datetime.now()-started} elapsed \
+        {statistics[0].processed} files scanned, {estimate['files']} files ({estimate['bytes']/2**20:.1f} MB) to copy \
+        in about {estimate['seconds']:.0f} s, {estimate['skipped']} skipped")
+        print(f"Plan written to {planPath}: {estimate['files']} files, {estimate['bytes']/2**20:.1f} MB, "
+              f"about {estimate['seconds']:.0f} s")
+        return
+    failed = sum(stage.failed for stage in statistics)
+    if failed == 0:
+        runJournal.clear()
+    else:
+        runJournal.sync()
+    logging.info(f"{', '.join(inputPaths)} ended at {datetime.now()}, {datetime.now()-started} elapsed \
+        {statistics[0].processed} files scanned, {organizer.relocated} files relocated, {organizer.duplicates} duplicates skipped, \
+        {placementSummary.report()}")
+
+def planJournal(planPath):
+    return journal.RelocationJournal(journal.pathFor("plan", os.path.abspath(planPath)))
+
+def executePlan(planPath):
+    """
+    Executes a plan written by scanDir, skipping the entries already done
+    """
+    started = datetime.now()
+    executedJournal = planJournal(planPath)
+    counters = relocationplan.PlanExecutor(lambda source, destination: relocate([source, destination]),
+                                           journal=executedJournal).execute(relocationplan.RelocationPlan(planPath))
+    if counters["failed"] == 0:
+        executedJournal.clear()
+    logging.info(f"{planPath} executed at {datetime.now()}, {datetime.now()-started} elapsed \
+        {counters['placed']} files relocated, {counters['failed']} failed, {counters['resumed']} already done, \
+        {placementSummary.report()}")
 
 while True:
-    decision = input("directory or file? (d/f):")
+    decision = input("directory, file, plan a directory or execute the plan? (d/f/p/e):")
     if decision == "d":
         scanDir()
+    elif decision == "p":
+        scanDir(CommonVariables.relocationPlanPath)
+    elif decision == "e":
+        executePlan(CommonVariables.relocationPlanPath)
     elif decision == "f":
         scanFile()
     else:
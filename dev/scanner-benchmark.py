@@ -0,0 +1,47 @@
+import os, sys, tempfile, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib import scanner
+
+depth, fanout, filesPerFolder = 6, 3, 10
+
+def syntheticTree(folder, level=0):
+    for index in range(filesPerFolder):
+        extension = ["nef", "jpg", "txt"][index % 3]
+        open(os.path.join(folder, f"picture{index}.{extension}"), "w").close()
+    if level < depth:
+        for index in range(fanout):
+            subfolder = os.path.join(folder, f"folder{index}")
+            os.mkdir(subfolder)
+            syntheticTree(subfolder, level+1)
+
+def osWalkLoop(roots):
+    # Directory walk as image-organizer.scanDir did it before the scanner module
+    validExtensions = ["jpg","nef","png","tiff","dng","jpeg","raw","mp4","mov","heic"]
+    scanDirs, found = [], []
+    for inputPath in roots:
+        for directory in os.walk(inputPath):
+            if not directory[0] in scanDirs:
+                scanDirs.append(directory[0])
+    for folderPath in scanDirs:
+        for possibleImage in os.listdir(folderPath):
+            splitted = possibleImage.split(".")
+            if len(splitted) > 1 and splitted[-1].lower() in validExtensions:
+                imagePath = os.path.join(folderPath, possibleImage)
+                found.append((imagePath, os.path.getsize(imagePath)))
+    return found
+
+def measure(name, function, roots):
+    started = time.perf_counter()
+    found = len(list(function(roots)))
+    print(f"{name}: {found} files in {time.perf_counter()-started:.3f} s")
+
+with tempfile.TemporaryDirectory() as folder:
+    roots = []
+    for rootIndex in range(int(sys.argv[1]) if len(sys.argv) > 1 else 2):
+        root = os.path.join(folder, f"root{rootIndex}")
+        os.mkdir(root)
+        syntheticTree(root)
+        roots.append(root)
+    measure("os.walk loop", osWalkLoop, roots)
+    measure("scanFiles", scanner.scanFiles, roots)
+    measure("scanFilesParallel", scanner.scanFilesParallel, roots)
@@ -0,0 +1,70 @@
+import os, sys, struct, tempfile, timeit
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from tiffreader import *
+
+rootPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+samplePaths = [os.path.join(rootPath, "test0.tiff"), os.path.join(rootPath, "test.jpeg")]
+repetitions = 200
+
+def legacyParseIFD(image, record, offset, numberOfTags):
+    # Tag assignment as done before the tag schema: one exec per tag
+    entries = image.readAt(offset+2, numberOfTags*12)
+    for tagIndex in range(numberOfTags):
+        tag, tag_type, tag_count = struct.unpack_from(image.direction+"HHL", entries, tagIndex*12)
+        if tag_count*TIFF_TYPES[tag_type][1] > 4:
+            tag_value = image.readTIFFDataAt(
+                struct.unpack_from(image.direction+"L", entries, tagIndex*12+8)[0], tag_type, tag_count)
+        else:
+            tag_value = unpackTIFFData(image.direction, tag_type, tag_count, entries, tagIndex*12+8)
+        if isinstance(tag_value, str):
+            tag_value=tag_value.replace("\'", "\\\'")
+            tag_value=tag_value.replace("\"", "\\\"")
+            string=f"record.{tagSpec(tag).name} = \'{tag_value}\'"
+        else:
+            string=f"record.{tagSpec(tag).name} = {tag_value}"
+        exec(string)
+    return record
+
+def syntheticTIFF(folder):
+    # Little endian TIFF with a single IFD of ASCII, SHORT, LONG and RATIONAL tags
+    entries = [(256, 4, 1, 6000), (257, 4, 1, 4000), (259, 3, 1, 1), (274, 3, 1, 1), (277, 3, 1, 3),
+               (284, 3, 1, 1), (296, 3, 1, 2), (34855, 3, 1, 400), (37383, 3, 1, 5), (41986, 3, 1, 0)]
+    strings = [(271, "NIKON CORPORATION"), (272, "NIKON D750"), (305, "Ver.1.10"),
+               (306, "2020:09:10 06:00:02"), (36867, "2020:09:10 06:00:02"), (315, "It's \"quoted\"")]
+    rationals = [(282, 300, 1), (283, 300, 1), (33434, 1, 250), (33437, 56, 10), (37386, 500, 10)]
+    numberOfTags = len(entries)+len(strings)+len(rationals)
+    valuesOffset = 8+2+numberOfTags*12+4
+    ifd, values = b"", b""
+    for tag, typeData, count, value in entries:
+        ifd += struct.pack("<HHLL", tag, typeData, count, value)
+    for tag, value in strings:
+        raw = value.encode()+b"\x00"
+        ifd += struct.pack("<HHLL", tag, 2, len(raw), valuesOffset+len(values))
+        values += raw+b"\x00"*(len(raw) % 2)
+    for tag, numerator, denominator in rationals:
+        ifd += struct.pack("<HHLL", tag, 5, 1, valuesOffset+len(values))
+        values += struct.pack("<LL", numerator, denominator)
+    imagePath = os.path.join(folder, "synthetic.tiff")
+    with open(imagePath, "wb") as imageFile:
+        imageFile.write(b"II"+struct.pack("<HLH", 42, 8, numberOfTags)+ifd+struct.pack("<L", 0)+values)
+    return imagePath
+
+def benchmark(imagePath):
+    image = NEFImage(imagePath, readMode="mmap")
+    try:
+        numberOfTags = image.numberOfTagsFirstIFD
+    except (ValueError, struct.error):
+        print(f"{os.path.basename(imagePath)}: not a TIFF file, skipped")
+        return False
+    legacy = timeit.timeit(lambda: legacyParseIFD(image, tagsIFD(), image.offsetFirstIFD, numberOfTags), number=repetitions)
+    schema = timeit.timeit(lambda: image.parseIFD(tagsIFD(), image.offsetFirstIFD, numberOfTags), number=repetitions)
+    print(f"{os.path.basename(imagePath)}: {numberOfTags} tags, exec {legacy/repetitions*1e6:.1f} us/IFD, "
+          f"schema {schema/repetitions*1e6:.1f} us/IFD, {legacy/schema:.1f}x faster")
+    image.close()
+    return True
+
+paths = sys.argv[1:] or samplePaths
+results = [benchmark(path) for path in paths if os.path.isfile(path)]
+if not any(results):
+    with tempfile.TemporaryDirectory() as folder:
+        benchmark(syntheticTIFF(folder))
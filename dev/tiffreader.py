@@ -1,25 +1,464 @@
 import os
+import atexit
 import logging
+import mmap
 import struct
 import json
+import threading
 import time
+from collections import OrderedDict, namedtuple
 
 class tagsIFD:
     def __init__(self):
         pass
 
+
+# TIFF field types: typeData -> (struct format, bytes per value).
+# RATIONAL and SRATIONAL values are numerator/denominator pairs.
+TIFF_TYPES = {
+    1: ("B", 1),    # BYTE
+    2: ("s", 1),    # ASCII
+    3: ("H", 2),    # SHORT
+    4: ("L", 4),    # LONG
+    5: ("L", 8),    # RATIONAL
+    6: ("b", 1),    # SBYTE
+    7: ("B", 1),    # UNDEFINED
+    8: ("h", 2),    # SSHORT
+    9: ("l", 4),    # SLONG
+    10: ("l", 8),   # SRATIONAL
+    11: ("f", 4),   # FLOAT
+    12: ("d", 8),   # DOUBLE
+    13: ("L", 4),   # IFD
+}
+
+
+def unpackTIFFData(direction, typeData, count, buffer, offset=0):
+    """
+    unpackTIFFData Decodes "count" values of type "typeData" from a buffer
+
+    :param direction: struct byte order prefix, "<" or ">"
+    :type direction: str
+    :param typeData: TIFF field type, see TIFF_TYPES
+    :type typeData: int
+    :param count: Number of values to decode
+    :type count: int
+    :param buffer: bytes, bytearray, mmap or memoryview holding the values
+    :param offset: Position of the first value inside buffer, by default 0
+    :type offset: int, optional
+    :return: A single value when count is 1, a list otherwise. ASCII values
+        are returned as a string without the trailing NUL.
+    :rtype: int, float, str, list
+    """
+    structure = TIFF_TYPES[typeData][0]
+    if typeData == 2:
+        return bytes(buffer[offset:offset+count]).rstrip(b"\x00").decode("utf-8", "replace")
+    if typeData in [1, 7]:
+        data = list(buffer[offset:offset+count])
+    elif typeData in [5, 10]:
+        pairs = struct.unpack_from(f"{direction}{2*count}{structure}", buffer, offset)
+        data = [numerator/denominator if denominator else 0.0
+                for numerator, denominator in zip(pairs[0::2], pairs[1::2])]
+    else:
+        data = list(struct.unpack_from(f"{direction}{count}{structure}", buffer, offset))
+    if len(data) == 1:
+        return data[0]
+    return data
+
+
+TAGS = {0:'GPSVersionID', 1:'GPSLatitudeRef', 2:'GPSLatitude', 3:'GPSLongitudeRef', 4:'GPSLongitude', 5:'GPSAltitudeRef', 6:'GPSAltitude', 7:'GPSTimeStamp', 8:'GPSSatellites', 9:'GPSStatus', 10:'GPSMeasureMode', 11:'GPSDOP', 12:'GPSSpeedRef', 13:'GPSSpeed', 14:'GPSTrackRef', 15:'GPSTrack', 16:'GPSImgDirectionRef', 17:'GPSImgDirection', 18:'GPSMapDatum', 19:'GPSDestLatitudeRef', 20:'GPSDestLatitude', 21:'GPSDestLongitudeRef', 22:'GPSDestLongitude', 23:'GPSDestBearingRef', 24:'GPSDestBearing', 25:'GPSDestDistanceRef', 26:'GPSDestDistance', 27:'GPSProcessingMethod', 28:'GPSAreaInformation', 29:'GPSDateStamp', 30:'GPSDifferential', 254:'NewSubfileType', 255:'SubfileType', 256:'ImageWidth', 257:'ImageLength', 258:'BitsPerSample', 259:'Compression', 262:'PhotometricInterpretation', 263:'Threshholding', 264:'CellWidth', 265:'CellLength', 266:'FillOrder', 269:'DocumentName', 270:'ImageDescription', 271:'Make', 272:'Model', 273:'StripOffsets', 274:'Orientation', 277:'SamplesPerPixel', 278:'RowsPerStrip', 279:'StripByteCounts', 280:'MinSampleValue', 281:'MaxSampleValue', 282:'XResolution', 283:'YResolution', 284:'PlanarConfiguration', 285:'PageName', 286:'XPosition', 287:'YPosition', 288:'FreeOffsets', 289:'FreeByteCounts', 290:'GrayResponseUnit', 291:'GrayResponseCurve', 292:'T4Options', 293:'T6Options', 296:'ResolutionUnit', 297:'PageNumber', 301:'TransferFunction', 305:'Software', 306:'DateTime', 315:'Artist', 316:'HostComputer', 317:'Predictor', 318:'WhitePoint', 319:'PrimaryChromaticities', 320:'ColorMap', 321:'HalftoneHints', 322:'TileWidth', 323:'TileLength', 324:'TileOffsets', 325:'TileByteCounts', 326:'BadFaxLines', 327:'CleanFaxData', 328:'ConsecutiveBadFaxLines', 330:'SubIFDs', 332:'InkSet', 333:'InkNames', 334:'NumberOfInks', 336:'DotRange', 337:'TargetPrinter', 338:'ExtraSamples', 339:'SampleFormat', 340:'SMinSampleValue', 341:'SMaxSampleValue', 342:'TransferRange', 343:'ClipPath', 344:'XClipPathUnits', 345:'YClipPathUnits', 346:'Indexed', 347:'JPEGTables', 351:'OPIProxy', 400:'GlobalParametersIFD', 401:'ProfileType', 402:'FaxProfile', 403:'CodingMethods', 404:'VersionYear', 405:'ModeNumber', 433:'Decode', 434:'DefaultImageColor', 512:'JPEGProc', 513:'JPEGInterchangeFormat', 514:'JPEGInterchangeFormatLength', 515:'JPEGRestartInterval', 517:'JPEGLosslessPredictors', 518:'JPEGPointTransforms', 519:'JPEGQTables', 520:'JPEGDCTables', 521:'JPEGACTables', 529:'YCbCrCoefficients', 530:'YCbCrSubSampling', 531:'YCbCrPositioning', 532:'ReferenceBlackWhite', 559:'StripRowCounts', 700:'XMP', 18246:'Image.Rating', 18249:'Image.RatingPercent', 32781:'ImageID', 32932:'Wang_Annotation', 33421:'CFARepeatPatternDim', 33422:'CFAPattern', 33423:'BatteryLevel', 33432:'Copyright', 33434:'ExposureTime', 33437:'FNumber', 33445:'MD_FileTag', 33446:'MD_ScalePixel', 33447:'MD_ColorTable', 33448:'MD_LabName', 33449:'MD_SampleInfo', 33450:'MD_PrepDate', 33451:'MD_PrepTime', 33452:'MD_FileUnits', 33550:'ModelPixelScaleTag', 33723:'IPTC_NAA', 33918:'INGR_Packet_Data_Tag', 33919:'INGR_Flag_Registers', 33920:'IrasB_Transformation_Matrix', 33922:'ModelTiepointTag', 34016:'Site', 34017:'ColorSequence', 34018:'IT8Header', 34019:'RasterPadding', 34020:'BitsPerRunLength', 34021:'BitsPerExtendedRunLength', 34022:'ColorTable', 34023:'ImageColorIndicator', 34024:'BackgroundColorIndicator', 34025:'ImageColorValue', 34026:'BackgroundColorValue', 34027:'PixelIntensityRange', 34028:'TransparencyIndicator', 34029:'ColorCharacterization', 34030:'HCUsage', 34031:'TrapIndicator', 34032:'CMYKEquivalent', 34033:'Reserved', 34034:'Reserved', 34035:'Reserved', 34264:'ModelTransformationTag', 34377:'Photoshop', 34665:'Exif_IFD', 34675:'InterColorProfile', 34732:'ImageLayer', 34735:'GeoKeyDirectoryTag', 34736:'GeoDoubleParamsTag', 34737:'GeoAsciiParamsTag', 34850:'ExposureProgram', 34852:'SpectralSensitivity', 34853:'GPSInfo', 34855:'ISOSpeedRatings', 34856:'OECF', 34857:'Interlace', 34858:'TimeZoneOffset', 34859:'SelfTimeMode', 34864:'SensitivityType', 34865:'StandardOutputSensitivity', 34866:'RecommendedExposureIndex', 34867:'ISOSpeed', 34868:'ISOSpeedLatitudeyyy', 34869:'ISOSpeedLatitudezzz', 34908:'HylaFAX_FaxRecvParams', 34909:'HylaFAX_FaxSubAddress', 34910:'HylaFAX_FaxRecvTime', 36864:'ExifVersion', 36867:'DateTimeOriginal', 36868:'DateTimeDigitized', 37121:'ComponentsConfiguration', 37122:'CompressedBitsPerPixel', 37377:'ShutterSpeedValue', 37378:'ApertureValue', 37379:'BrightnessValue', 37380:'ExposureBiasValue', 37381:'MaxApertureValue', 37382:'SubjectDistance', 37383:'MeteringMode', 37384:'LightSource', 37385:'Flash', 37386:'FocalLength', 37387:'FlashEnergy', 37388:'SpatialFrequencyResponse', 37389:'Noise', 37390:'FocalPlaneXResolution', 37391:'FocalPlaneYResolution', 37392:'FocalPlaneResolutionUnit', 37393:'ImageNumber', 37394:'SecurityClassification', 37395:'ImageHistory', 37396:'SubjectLocation', 37397:'ExposureIndex', 37398:'TIFF_EPStandardID', 37399:'SensingMethod', 37500:'MakerNote', 37510:'UserComment', 37520:'SubsecTime', 37521:'SubsecTimeOriginal', 37522:'SubsecTimeDigitized', 37724:'ImageSourceData', 40091:'XPTitle', 40092:'XPComment', 40093:'XPAuthor', 40094:'XPKeywords', 40095:'XPSubject', 40960:'FlashpixVersion', 40961:'ColorSpace', 40962:'PixelXDimension', 40963:'PixelYDimension', 40964:'RelatedSoundFile', 40965:'Interoperability_IFD', 41483:'FlashEnergy', 41484:'SpatialFrequencyResponse', 41486:'FocalPlaneXResolution', 41487:'FocalPlaneYResolution', 41488:'FocalPlaneResolutionUnit', 41492:'SubjectLocation', 41493:'ExposureIndex', 41495:'SensingMethod', 41728:'FileSource', 41729:'SceneType', 41730:'CFAPattern', 41985:'CustomRendered', 41986:'ExposureMode', 41987:'WhiteBalance', 41988:'DigitalZoomRatio', 41989:'FocalLengthIn35mmFilm', 41990:'SceneCaptureType', 41991:'GainControl', 41992:'Contrast', 41993:'Saturation', 41994:'Sharpness', 41995:'DeviceSettingDescription', 41996:'SubjectDistanceRange', 42016:'ImageUniqueID', 42032:'CameraOwnerName', 42033:'BodySerialNumber', 42034:'LensSpecification', 42035:'LensMake', 42036:'LensModel', 42037:'LensSerialNumber', 42112:'GDAL_METADATA', 42113:'GDAL_NODATA', 48129:'PixelFormat', 48130:'Transformation', 48131:'Uncompressed', 48132:'ImageType', 48256:'ImageWidth', 48257:'ImageHeight', 48258:'WidthResolution', 48259:'HeightResolution', 48320:'ImageOffset', 48321:'ImageByteCount', 48322:'AlphaOffset', 48323:'AlphaByteCount', 48324:'ImageDataDiscard', 48325:'AlphaDataDiscard', 50215:'Oce_Scanjob_Description', 50216:'Oce_Application_Selector', 50217:'Oce_Identification_Number', 50218:'Oce_ImageLogic_Characteristics', 50341:'PrintImageMatching', 50706:'DNGVersion', 50707:'DNGBackwardVersion', 50708:'UniqueCameraModel', 50709:'LocalizedCameraModel', 50710:'CFAPlaneColor', 50711:'CFALayout', 50712:'LinearizationTable', 50713:'BlackLevelRepeatDim', 50714:'BlackLevel', 50715:'BlackLevelDeltaH', 50716:'BlackLevelDeltaV', 50717:'WhiteLevel', 50718:'DefaultScale', 50719:'DefaultCropOrigin', 50720:'DefaultCropSize', 50721:'ColorMatrix1', 50722:'ColorMatrix2', 50723:'CameraCalibration1', 50724:'CameraCalibration2', 50725:'ReductionMatrix1', 50726:'ReductionMatrix2', 50727:'AnalogBalance', 50728:'AsShotNeutral', 50729:'AsShotWhiteXY', 50730:'BaselineExposure', 50731:'BaselineNoise', 50732:'BaselineSharpness', 50733:'BayerGreenSplit', 50734:'LinearResponseLimit', 50735:'CameraSerialNumber', 50736:'LensInfo', 50737:'ChromaBlurRadius', 50738:'AntiAliasStrength', 50739:'ShadowScale', 50740:'DNGPrivateData', 50741:'MakerNoteSafety', 50778:'CalibrationIlluminant1', 50779:'CalibrationIlluminant2', 50780:'BestQualityScale', 50781:'RawDataUniqueID', 50784:'Alias_Layer_Metadata', 50827:'OriginalRawFileName', 50828:'OriginalRawFileData', 50829:'ActiveArea', 50830:'MaskedAreas', 50831:'AsShotICCProfile', 50832:'AsShotPreProfileMatrix', 50833:'CurrentICCProfile', 50834:'CurrentPreProfileMatrix', 50879:'ColorimetricReference', 50931:'CameraCalibrationSignature', 50932:'ProfileCalibrationSignature', 50933:'ExtraCameraProfiles', 50934:'AsShotProfileName', 50935:'NoiseReductionApplied', 50936:'ProfileName', 50937:'ProfileHueSatMapDims', 50938:'ProfileHueSatMapData1', 50939:'ProfileHueSatMapData2', 50940:'ProfileToneCurve', 50941:'ProfileEmbedPolicy', 50942:'ProfileCopyright', 50964:'ForwardMatrix1', 50965:'ForwardMatrix2', 50966:'PreviewApplicationName', 50967:'PreviewApplicationVersion', 50968:'PreviewSettingsName', 50969:'PreviewSettingsDigest', 50970:'PreviewColorSpace', 50971:'PreviewDateTime', 50972:'RawImageDigest', 50973:'OriginalRawFileDigest', 50974:'SubTileBlockSize', 50975:'RowInterleaveFactor', 50981:'ProfileLookTableDims', 50982:'ProfileLookTableData', 51008:'OpcodeList1', 51009:'OpcodeList2', 51022:'OpcodeList3', 51041:'NoiseProfile', 51089:'OriginalDefaultFinalSize', 51090:'OriginalBestQualityFinalSize', 51091:'OriginalDefaultCropSize', 51107:'ProfileHueSatMapEncoding', 51108:'ProfileLookTableEncoding', 51109:'BaselineExposureOffset', 51110:'DefaultBlackRender', 51111:'NewRawImageDigest', 51112:'RawToPreviewGain', 51125:'DefaultUserCrop'}
+
+TagSpec = namedtuple("TagSpec", ["name", "types", "converter"])
+
+# Expected field types and value converters of the tags the organizer and the
+# IFD traversal rely on. Any other known tag is stored as decoded.
+TAG_TYPES = {
+    256: ((3, 4), int), 257: ((3, 4), int), 258: ((3,), None), 259: ((3,), int),
+    271: ((2,), str), 272: ((2,), str), 273: ((3, 4), None), 277: ((3,), int),
+    278: ((3, 4), int), 279: ((3, 4), None), 284: ((3,), int), 305: ((2,), str),
+    306: ((2,), str), 322: ((3, 4), int), 323: ((3, 4), int), 324: ((4,), None),
+    325: ((3, 4), None), 330: ((4, 13), None), 513: ((4,), int), 514: ((4,), int),
+    34665: ((4, 13), int), 34853: ((4, 13), int), 36867: ((2,), str),
+    36868: ((2,), str), 40965: ((4, 13), int),
+}
+
+# Tags of the Interoperability IFD
+INTEROPERABILITY_TAGS = {1:'InteroperabilityIndex', 2:'InteroperabilityVersion', 4096:'RelatedImageFileFormat',
+                         4097:'RelatedImageWidth', 4098:'RelatedImageLength'}
+
+# Tags of the Nikon MakerNote IFD
+NIKON_TAGS = {1:'MakerNoteVersion', 2:'ISO', 3:'ColorMode', 4:'Quality', 5:'WhiteBalance', 6:'Sharpness',
+              7:'FocusMode', 8:'FlashSetting', 9:'FlashType', 11:'WhiteBalanceFineTune', 12:'WB_RBLevels',
+              13:'ProgramShift', 14:'ExposureDifference', 17:'PreviewIFD', 18:'FlashExposureComp',
+              19:'ISOSetting', 27:'CropHiSpeed', 29:'SerialNumber', 30:'ColorSpace', 34:'ActiveDLighting',
+              35:'PictureControlData', 37:'ISOInfo', 128:'ImageAdjustment', 131:'LensType', 132:'Lens',
+              135:'FlashMode', 136:'AFInfo', 137:'ShootingMode', 139:'LensFStops', 145:'ShotInfo',
+              146:'HueAdjustment', 147:'NEFCompression', 149:'NoiseReduction', 150:'NEFLinearizationTable',
+              151:'ColorBalance', 152:'LensData', 153:'RawImageCenter', 154:'SensorPixelSize',
+              167:'ShutterCount', 168:'FlashInfo', 171:'VariProgram', 177:'HighISONoiseReduction',
+              183:'AFInfo2', 187:'RetouchInfo'}
+
+# GPS tags (0 to 30) only stand for themselves in the GPS IFD
+TAG_SCHEMA = {tag: TagSpec(name, *TAG_TYPES.get(tag, (None, None)))
+              for tag, name in TAGS.items() if tag > 30}
+
+# Tags of the IFDs not following the TIFF/EXIF numbering, by IFD name (see
+# NEFImage.ifd); every other IFD uses TAG_SCHEMA
+IFD_TAG_SCHEMAS = {
+    "GPS": {tag: TagSpec(name, None, None) for tag, name in TAGS.items() if tag <= 30},
+    "Interoperability": {tag: TagSpec(name, None, None) for tag, name in INTEROPERABILITY_TAGS.items()},
+    "MakerNote": {tag: TagSpec(name, None, None) for tag, name in NIKON_TAGS.items()},
+}
+
+
+def tagSpec(tag, schema=TAG_SCHEMA):
+    """
+    tagSpec Returns the TagSpec of "tag" in the "schema" tag table, naming
+    unknown tags after their id
+    """
+    if tag in schema:
+        return schema[tag]
+    return TagSpec(f"Tag{tag}", None, None)
+
+
+class FileReader:
+    """
+    Serves byte ranges of an image through a buffered file handle.
+    """
+
+    def __init__(self, imagePath):
+        self.file = open(imagePath, "rb")
+        self.bytesRead = 0
+
+    def read(self, offset, length):
+        self.file.seek(offset)
+        data = self.file.read(length)
+        self.bytesRead += len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class MmapReader:
+    """
+    Serves byte ranges of an image as zero-copy slices of a memory map.
+
+    The file is mapped once; every read is plain offset arithmetic on a
+    memoryview, so parsing issues no seek or read syscalls at all.
+    """
+
+    def __init__(self, imagePath):
+        with open(imagePath, "rb") as imageFile:
+            self.file = mmap.mmap(imageFile.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.file)
+        self.bytesRead = 0
+
+    def read(self, offset, length):
+        data = self.buffer[offset:offset+length]
+        self.bytesRead += len(data)
+        return data
+
+    def close(self):
+        try:
+            self.buffer.release()
+            self.file.close()
+        except BufferError:
+            # Slices returned by read() are still alive; the map is released
+            # once the last of them is garbage collected.
+            pass
+
+
+HEADER_SIZE = 64*1024
+
+# Embedded JPEG preview: IFD name, absolute offset and length of the JPEG
+# stream, and its dimensions when the IFD states them (None otherwise)
+PreviewInfo = namedtuple("PreviewInfo", ["ifd", "offset", "length", "width", "height"])
+
+# Bytes of a JPEG stream scanned for its frame header by jpegSize
+JPEG_HEADER_SIZE = 4096
+
+
+def jpegSize(buffer):
+    """
+    jpegSize Returns the (width, height) stated by the frame header (SOFn
+    marker) of the JPEG stream in buffer, (None, None) when it is not found
+    """
+    position = 2
+    while position+9 <= len(buffer):
+        if buffer[position] != 0xFF:
+            break
+        marker = buffer[position+1]
+        if marker in [0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF]:
+            height, width = struct.unpack_from(">HH", buffer, position+5)
+            return (width, height)
+        position += 2+struct.unpack_from(">H", buffer, position+2)[0]
+    return (None, None)
+
+
+class HeaderReader:
+    """
+    Serves byte ranges of an image from a single read of its first bytes.
+
+    Metadata only needs IFD0 and the EXIF SubIFD, which cameras write at the
+    start of the file. The first "headerSize" bytes are fetched with one
+    read; ranges falling outside of that buffer are fetched with an extra
+    ranged read. bytesRead reports the total transferred for the file.
+    """
+
+    def __init__(self, imagePath, headerSize=None):
+        self.file = open(imagePath, "rb")
+        self.headerSize = headerSize or HEADER_SIZE
+        self.bytesRead = 0
+
+    @property
+    def header(self):
+        if not hasattr(self, "_header"):
+            self.file.seek(0)
+            self._header = memoryview(self.file.read(self.headerSize))
+            self.bytesRead += len(self._header)
+        return self._header
+
+    def read(self, offset, length):
+        header = self.header
+        if offset+length <= len(header) or len(header) < self.headerSize:
+            return header[offset:offset+length]
+        self.file.seek(offset)
+        data = self.file.read(length)
+        self.bytesRead += len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class BlockCacheReader:
+    """
+    Serves byte ranges of an image through a cache of fixed-size, aligned
+    blocks filled by a ranged fetch function, e.g. ranged reads of a remote
+    object (see lib/remoteimage.py).
+
+    Missing blocks of a read are fetched together with a single call; the
+    blocks covering the first HEADER_SIZE bytes are fetched on the first
+    read, since the IFDs needed for metadata live there. At most maxBlocks
+    blocks are kept, evicting the least recently used. bytesRead reports the
+    total fetched.
+    """
+
+    def __init__(self, fetch, blockSize=HEADER_SIZE, maxBlocks=64, prefetch=HEADER_SIZE):
+        """
+        :param fetch: Called as fetch(offset, length), returns the bytes of
+            that range, fewer past the end of the image
+        :type fetch: callable
+        """
+        self.fetch = fetch
+        self.blockSize = blockSize
+        self.maxBlocks = max(maxBlocks, -(-prefetch//blockSize))
+        self.prefetch = prefetch
+        self.blocks = OrderedDict()
+        self.size = None
+        self.bytesRead = 0
+        self.file = None
+
+    def fetchBlocks(self, first, last):
+        data = self.fetch(first*self.blockSize, (last-first+1)*self.blockSize)
+        self.bytesRead += len(data)
+        if len(data) < (last-first+1)*self.blockSize:
+            self.size = first*self.blockSize+len(data)
+        for block in range(first, last+1):
+            start = (block-first)*self.blockSize
+            self.blocks[block] = data[start:start+self.blockSize]
+            self.blocks.move_to_end(block)
+
+    def read(self, offset, length):
+        if self.bytesRead == 0 and self.prefetch > 0:
+            self.fetchBlocks(0, (self.prefetch-1)//self.blockSize)
+        if self.size != None:
+            length = max(0, min(length, self.size-offset))
+        if length <= 0:
+            return b""
+        first, last = offset//self.blockSize, (offset+length-1)//self.blockSize
+        missing = [block for block in range(first, last+1) if not block in self.blocks]
+        if missing:
+            self.fetchBlocks(missing[0], missing[-1])
+        data = b"".join(self.blocks[block] for block in range(first, last+1) if block in self.blocks)
+        for block in range(first, last+1):
+            if block in self.blocks:
+                self.blocks.move_to_end(block)
+        # Evicting only now keeps every block of this read available above
+        while len(self.blocks) > self.maxBlocks:
+            self.blocks.popitem(last=False)
+        start = offset-first*self.blockSize
+        return data[start:start+length]
+
+    def close(self):
+        self.blocks.clear()
+
+
+READERS = {"file": FileReader, "mmap": MmapReader, "header": HeaderReader}
+
+SIDECAR_FILE = "sidecars.jsonl"
+SIDECAR_BATCH = 256
+
+
+class SidecarStore:
+    """
+    Metadata sidecars of the pictures of a folder, consolidated in a single
+    JSON-lines file (one {"name": ..., "tags": ...} object per line).
+
+    The file is read once per folder and indexed in memory; per-picture
+    .json sidecars left by older versions are picked up by the same single
+    directory listing and appended to the file the first time, after which
+    they are not read anymore. New sidecars are appended in batches of SIDECAR_BATCH
+    lines, later lines overriding earlier ones. Pending lines are flushed
+    when the interpreter exits.
+
+    Appends hold an exclusive lock on the file (on POSIX systems), so
+    processes sharing a folder neither interleave nor duplicate lines;
+    unreadable lines, such as one cut by a crash, are skipped.
+    """
+
+    stores = {}
+    storesLock = threading.Lock()
+
+    @classmethod
+    def forDirectory(cls, jsonDir):
+        jsonDir = os.path.abspath(jsonDir)
+        with cls.storesLock:
+            if not jsonDir in cls.stores:
+                cls.stores[jsonDir] = cls(jsonDir)
+            return cls.stores[jsonDir]
+
+    @classmethod
+    def flushAll(cls):
+        with cls.storesLock:
+            stores = list(cls.stores.values())
+        for store in stores:
+            store.flush()
+
+    def __init__(self, jsonDir, batchSize=SIDECAR_BATCH):
+        self.jsonDir = jsonDir
+        self.path = os.path.join(jsonDir, SIDECAR_FILE)
+        self.batchSize = batchSize
+        self.pending = []
+        self.lock = threading.Lock()
+
+    @property
+    def entries(self):
+        with self.lock:
+            if not hasattr(self, "_entries"):
+                self._entries = self.load()
+            return self._entries
+
+    def load(self):
+        entries = {}
+        try:
+            listing = list(os.scandir(self.jsonDir))
+        except (FileNotFoundError, NotADirectoryError):
+            return entries
+        if any(entry.name == SIDECAR_FILE for entry in listing):
+            with open(self.path, "rb") as sidecars:
+                entries = self.parse(sidecars)
+        # Per-picture sidecars not consolidated yet are folded into the
+        # consolidated file once, so later loads never open them again
+        legacy = {}
+        for entry in listing:
+            if entry.name.lower().endswith(".json") and not entry.name[:-5] in entries and entry.is_file():
+                try:
+                    with open(entry.path, "r") as json_file:
+                        legacy[entry.name[:-5]] = json.load(json_file)
+                except (OSError, ValueError) as legacy_e:
+                    logging.debug(f"{entry.path}: unreadable sidecar skipped ({legacy_e})")
+        entries.update(legacy)
+        if len(legacy) > 0:
+            try:
+                with self.openLocked() as sidecars:
+                    # Another process may have folded them since the file was read
+                    sidecars.seek(0)
+                    folded = self.parse(sidecars)
+                    self.write(sidecars, [json.dumps({"name": name, "tags": tags}, sort_keys=True)
+                                          for name, tags in legacy.items() if not name in folded])
+            except OSError:
+                pass
+        return entries
+
+    @staticmethod
+    def parse(sidecars):
+        """
+        Returns the {name: tags} dict of the lines of the binary file sidecars.
+        """
+        entries = {}
+        for line in sidecars:
+            try:
+                sidecar = json.loads(line)
+                entries[sidecar["name"]] = sidecar["tags"]
+            except (ValueError, KeyError, TypeError):
+                # Blank, or cut by a crash
+                continue
+        return entries
+
+    def openLocked(self):
+        """
+        Opens the sidecars file for appending, once no other process holds it.
+        The lock is released when the file is closed.
+        """
+        os.makedirs(self.jsonDir, exist_ok=True)
+        sidecars = open(self.path, "a+b")
+        if os.name == "posix":
+            import fcntl
+            fcntl.flock(sidecars.fileno(), fcntl.LOCK_EX)
+        return sidecars
+
+    @staticmethod
+    def write(sidecars, lines):
+        if len(lines) == 0:
+            return
+        data = ("\n".join(lines)+"\n").encode()
+        sidecars.seek(0, os.SEEK_END)
+        if sidecars.tell() > 0:
+            # A last line cut by a crash must not swallow the first new one
+            sidecars.seek(-1, os.SEEK_END)
+            if sidecars.read(1) != b"\n":
+                data = b"\n"+data
+        sidecars.write(data)
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def append(self, name, tags):
+        entries = self.entries
+        with self.lock:
+            entries[name] = tags
+            self.pending.append(json.dumps({"name": name, "tags": tags}, sort_keys=True))
+            full = len(self.pending) >= self.batchSize
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if len(self.pending) == 0:
+                return
+            with self.openLocked() as sidecars:
+                self.write(sidecars, self.pending)
+            self.pending = []
+
+
+atexit.register(SidecarStore.flushAll)
+
+
 class TIFFImage:
-    
+
     @property
     def tags(self):
-        return {0:'GPSVersionID', 1:'GPSLatitudeRef', 2:'GPSLatitude', 3:'GPSLongitudeRef', 4:'GPSLongitude', 5:'GPSAltitudeRef', 6:'GPSAltitude', 7:'GPSTimeStamp', 8:'GPSSatellites', 9:'GPSStatus', 10:'GPSMeasureMode', 11:'GPSDOP', 12:'GPSSpeedRef', 13:'GPSSpeed', 14:'GPSTrackRef', 15:'GPSTrack', 16:'GPSImgDirectionRef', 17:'GPSImgDirection', 18:'GPSMapDatum', 19:'GPSDestLatitudeRef', 20:'GPSDestLatitude', 21:'GPSDestLongitudeRef', 22:'GPSDestLongitude', 23:'GPSDestBearingRef', 24:'GPSDestBearing', 25:'GPSDestDistanceRef', 26:'GPSDestDistance', 27:'GPSProcessingMethod', 28:'GPSAreaInformation', 29:'GPSDateStamp', 30:'GPSDifferential', 254:'NewSubfileType', 255:'SubfileType', 256:'ImageWidth', 257:'ImageLength', 258:'BitsPerSample', 259:'Compression', 262:'PhotometricInterpretation', 263:'Threshholding', 264:'CellWidth', 265:'CellLength', 266:'FillOrder', 269:'DocumentName', 270:'ImageDescription', 271:'Make', 272:'Model', 273:'StripOffsets', 274:'Orientation', 277:'SamplesPerPixel', 278:'RowsPerStrip', 279:'StripByteCounts', 280:'MinSampleValue', 281:'MaxSampleValue', 282:'XResolution', 283:'YResolution', 284:'PlanarConfiguration', 285:'PageName', 286:'XPosition', 287:'YPosition', 288:'FreeOffsets', 289:'FreeByteCounts', 290:'GrayResponseUnit', 291:'GrayResponseCurve', 292:'T4Options', 293:'T6Options', 296:'ResolutionUnit', 297:'PageNumber', 301:'TransferFunction', 305:'Software', 306:'DateTime', 315:'Artist', 316:'HostComputer', 317:'Predictor', 318:'WhitePoint', 319:'PrimaryChromaticities', 320:'ColorMap', 321:'HalftoneHints', 322:'TileWidth', 323:'TileLength', 324:'TileOffsets', 325:'TileByteCounts', 326:'BadFaxLines', 327:'CleanFaxData', 328:'ConsecutiveBadFaxLines', 330:'SubIFDs', 332:'InkSet', 333:'InkNames', 334:'NumberOfInks', 336:'DotRange', 337:'TargetPrinter', 338:'ExtraSamples', 339:'SampleFormat', 340:'SMinSampleValue', 341:'SMaxSampleValue', 342:'TransferRange', 343:'ClipPath', 344:'XClipPathUnits', 345:'YClipPathUnits', 346:'Indexed', 347:'JPEGTables', 351:'OPIProxy', 400:'GlobalParametersIFD', 401:'ProfileType', 402:'FaxProfile', 403:'CodingMethods', 404:'VersionYear', 405:'ModeNumber', 433:'Decode', 434:'DefaultImageColor', 512:'JPEGProc', 513:'JPEGInterchangeFormat', 514:'JPEGInterchangeFormatLength', 515:'JPEGRestartInterval', 517:'JPEGLosslessPredictors', 518:'JPEGPointTransforms', 519:'JPEGQTables', 520:'JPEGDCTables', 521:'JPEGACTables', 529:'YCbCrCoefficients', 530:'YCbCrSubSampling', 531:'YCbCrPositioning', 532:'ReferenceBlackWhite', 559:'StripRowCounts', 700:'XMP', 18246:'Image.Rating', 18249:'Image.RatingPercent', 32781:'ImageID', 32932:'Wang_Annotation', 33421:'CFARepeatPatternDim', 33422:'CFAPattern', 33423:'BatteryLevel', 33432:'Copyright', 33434:'ExposureTime', 33437:'FNumber', 33445:'MD_FileTag', 33446:'MD_ScalePixel', 33447:'MD_ColorTable', 33448:'MD_LabName', 33449:'MD_SampleInfo', 33450:'MD_PrepDate', 33451:'MD_PrepTime', 33452:'MD_FileUnits', 33550:'ModelPixelScaleTag', 33723:'IPTC_NAA', 33918:'INGR_Packet_Data_Tag', 33919:'INGR_Flag_Registers', 33920:'IrasB_Transformation_Matrix', 33922:'ModelTiepointTag', 34016:'Site', 34017:'ColorSequence', 34018:'IT8Header', 34019:'RasterPadding', 34020:'BitsPerRunLength', 34021:'BitsPerExtendedRunLength', 34022:'ColorTable', 34023:'ImageColorIndicator', 34024:'BackgroundColorIndicator', 34025:'ImageColorValue', 34026:'BackgroundColorValue', 34027:'PixelIntensityRange', 34028:'TransparencyIndicator', 34029:'ColorCharacterization', 34030:'HCUsage', 34031:'TrapIndicator', 34032:'CMYKEquivalent', 34033:'Reserved', 34034:'Reserved', 34035:'Reserved', 34264:'ModelTransformationTag', 34377:'Photoshop', 34665:'Exif_IFD', 34675:'InterColorProfile', 34732:'ImageLayer', 34735:'GeoKeyDirectoryTag', 34736:'GeoDoubleParamsTag', 34737:'GeoAsciiParamsTag', 34850:'ExposureProgram', 34852:'SpectralSensitivity', 34853:'GPSInfo', 34855:'ISOSpeedRatings', 34856:'OECF', 34857:'Interlace', 34858:'TimeZoneOffset', 34859:'SelfTimeMode', 34864:'SensitivityType', 34865:'StandardOutputSensitivity', 34866:'RecommendedExposureIndex', 34867:'ISOSpeed', 34868:'ISOSpeedLatitudeyyy', 34869:'ISOSpeedLatitudezzz', 34908:'HylaFAX_FaxRecvParams', 34909:'HylaFAX_FaxSubAddress', 34910:'HylaFAX_FaxRecvTime', 36864:'ExifVersion', 36867:'DateTimeOriginal', 36868:'DateTimeDigitized', 37121:'ComponentsConfiguration', 37122:'CompressedBitsPerPixel', 37377:'ShutterSpeedValue', 37378:'ApertureValue', 37379:'BrightnessValue', 37380:'ExposureBiasValue', 37381:'MaxApertureValue', 37382:'SubjectDistance', 37383:'MeteringMode', 37384:'LightSource', 37385:'Flash', 37386:'FocalLength', 37387:'FlashEnergy', 37388:'SpatialFrequencyResponse', 37389:'Noise', 37390:'FocalPlaneXResolution', 37391:'FocalPlaneYResolution', 37392:'FocalPlaneResolutionUnit', 37393:'ImageNumber', 37394:'SecurityClassification', 37395:'ImageHistory', 37396:'SubjectLocation', 37397:'ExposureIndex', 37398:'TIFF_EPStandardID', 37399:'SensingMethod', 37500:'MakerNote', 37510:'UserComment', 37520:'SubsecTime', 37521:'SubsecTimeOriginal', 37522:'SubsecTimeDigitized', 37724:'ImageSourceData', 40091:'XPTitle', 40092:'XPComment', 40093:'XPAuthor', 40094:'XPKeywords', 40095:'XPSubject', 40960:'FlashpixVersion', 40961:'ColorSpace', 40962:'PixelXDimension', 40963:'PixelYDimension', 40964:'RelatedSoundFile', 40965:'Interoperability_IFD', 41483:'FlashEnergy', 41484:'SpatialFrequencyResponse', 41486:'FocalPlaneXResolution', 41487:'FocalPlaneYResolution', 41488:'FocalPlaneResolutionUnit', 41492:'SubjectLocation', 41493:'ExposureIndex', 41495:'SensingMethod', 41728:'FileSource', 41729:'SceneType', 41730:'CFAPattern', 41985:'CustomRendered', 41986:'ExposureMode', 41987:'WhiteBalance', 41988:'DigitalZoomRatio', 41989:'FocalLengthIn35mmFilm', 41990:'SceneCaptureType', 41991:'GainControl', 41992:'Contrast', 41993:'Saturation', 41994:'Sharpness', 41995:'DeviceSettingDescription', 41996:'SubjectDistanceRange', 42016:'ImageUniqueID', 42032:'CameraOwnerName', 42033:'BodySerialNumber', 42034:'LensSpecification', 42035:'LensMake', 42036:'LensModel', 42037:'LensSerialNumber', 42112:'GDAL_METADATA', 42113:'GDAL_NODATA', 48129:'PixelFormat', 48130:'Transformation', 48131:'Uncompressed', 48132:'ImageType', 48256:'ImageWidth', 48257:'ImageHeight', 48258:'WidthResolution', 48259:'HeightResolution', 48320:'ImageOffset', 48321:'ImageByteCount', 48322:'AlphaOffset', 48323:'AlphaByteCount', 48324:'ImageDataDiscard', 48325:'AlphaDataDiscard', 50215:'Oce_Scanjob_Description', 50216:'Oce_Application_Selector', 50217:'Oce_Identification_Number', 50218:'Oce_ImageLogic_Characteristics', 50341:'PrintImageMatching', 50706:'DNGVersion', 50707:'DNGBackwardVersion', 50708:'UniqueCameraModel', 50709:'LocalizedCameraModel', 50710:'CFAPlaneColor', 50711:'CFALayout', 50712:'LinearizationTable', 50713:'BlackLevelRepeatDim', 50714:'BlackLevel', 50715:'BlackLevelDeltaH', 50716:'BlackLevelDeltaV', 50717:'WhiteLevel', 50718:'DefaultScale', 50719:'DefaultCropOrigin', 50720:'DefaultCropSize', 50721:'ColorMatrix1', 50722:'ColorMatrix2', 50723:'CameraCalibration1', 50724:'CameraCalibration2', 50725:'ReductionMatrix1', 50726:'ReductionMatrix2', 50727:'AnalogBalance', 50728:'AsShotNeutral', 50729:'AsShotWhiteXY', 50730:'BaselineExposure', 50731:'BaselineNoise', 50732:'BaselineSharpness', 50733:'BayerGreenSplit', 50734:'LinearResponseLimit', 50735:'CameraSerialNumber', 50736:'LensInfo', 50737:'ChromaBlurRadius', 50738:'AntiAliasStrength', 50739:'ShadowScale', 50740:'DNGPrivateData', 50741:'MakerNoteSafety', 50778:'CalibrationIlluminant1', 50779:'CalibrationIlluminant2', 50780:'BestQualityScale', 50781:'RawDataUniqueID', 50784:'Alias_Layer_Metadata', 50827:'OriginalRawFileName', 50828:'OriginalRawFileData', 50829:'ActiveArea', 50830:'MaskedAreas', 50831:'AsShotICCProfile', 50832:'AsShotPreProfileMatrix', 50833:'CurrentICCProfile', 50834:'CurrentPreProfileMatrix', 50879:'ColorimetricReference', 50931:'CameraCalibrationSignature', 50932:'ProfileCalibrationSignature', 50933:'ExtraCameraProfiles', 50934:'AsShotProfileName', 50935:'NoiseReductionApplied', 50936:'ProfileName', 50937:'ProfileHueSatMapDims', 50938:'ProfileHueSatMapData1', 50939:'ProfileHueSatMapData2', 50940:'ProfileToneCurve', 50941:'ProfileEmbedPolicy', 50942:'ProfileCopyright', 50964:'ForwardMatrix1', 50965:'ForwardMatrix2', 50966:'PreviewApplicationName', 50967:'PreviewApplicationVersion', 50968:'PreviewSettingsName', 50969:'PreviewSettingsDigest', 50970:'PreviewColorSpace', 50971:'PreviewDateTime', 50972:'RawImageDigest', 50973:'OriginalRawFileDigest', 50974:'SubTileBlockSize', 50975:'RowInterleaveFactor', 50981:'ProfileLookTableDims', 50982:'ProfileLookTableData', 51008:'OpcodeList1', 51009:'OpcodeList2', 51022:'OpcodeList3', 51041:'NoiseProfile', 51089:'OriginalDefaultFinalSize', 51090:'OriginalBestQualityFinalSize', 51091:'OriginalDefaultCropSize', 51107:'ProfileHueSatMapEncoding', 51108:'ProfileLookTableEncoding', 51109:'BaselineExposureOffset', 51110:'DefaultBlackRender', 51111:'NewRawImageDigest', 51112:'RawToPreviewGain', 51125:'DefaultUserCrop'}
+        return TAGS
 
     def readTIFFData(self, typeData, count, slotSize=None):
         """
         readTIFFData Reads binary content of a TIFF file
 
+        The whole value array is fetched with a single read and decoded with
+        :func:`unpackTIFFData`, whatever the number of values.
 
-        :param typeData: Defines datatype to be read: -#TODO add each datatype below
+        :param typeData: Defines datatype to be read, see TIFF_TYPES
         :type typeData: int
         :param count:   Number of dataType's to be read.
         :type count: int
@@ -28,93 +467,25 @@ class TIFFImage:
         :return: Returns an array of "count" "typeData" values
         :rtype: int[], float[], char[], string[]
         """
-        if typeData in [1, 7]:
-            structure = self.direction + "B"
-            if typeData in [1]:
-                bytesPerRead = 1
-            if typeData in [7]:
-                bytesPerRead = 1
-        elif typeData in [2]:
-            structure = self.direction + "c"
-            if typeData in [2]:
-                bytesPerRead = 1
-        elif typeData in [3]:
-            structure = self.direction + "H"
-            if typeData in [3]:
-                bytesPerRead = 2
-        elif typeData in [4, 5]:
-            structure = self.direction + "L"
-            if typeData in [4]:
-                bytesPerRead = 4
-            if typeData in [5]:
-                bytesPerRead = 4
-        elif typeData in [6]:
-            structure = self.direction + "b"
-            if typeData in [6]:
-                bytesPerRead = 1
-        elif typeData in [8]:
-            structure = self.direction + "h"
-            if typeData in [8]:
-                bytesPerRead = 2
-        elif typeData in [9, 10]:
-            structure = self.direction + "l"
-            if typeData in [9]:
-                bytesPerRead = 4
-            if typeData in [10]:
-                bytesPerRead = 4
-        elif typeData in [11]:
-            structure = self.direction + "f"
-            if typeData in [11]:
-                bytesPerRead = 4
-        elif typeData in [12]:
-            structure = self.direction + "f"
-            if typeData in [12]:
-                bytesPerRead = 8
-
-        data = []
+        bytesPerRead = TIFF_TYPES[typeData][1]
+        totalBytes = count*bytesPerRead
         read = 0
-        totalReads = count
-        if (typeData in [5, 10]):
-            totalReads = count*2
-        totalBytes = totalReads*bytesPerRead
         returnPos = 0
         if totalBytes > 4:
             returnPos = self.image_file.tell()
             self.image_file.seek(self.readTIFFData(4, 1))
             read = 4
-        for _ in range(totalReads):
-            data.append(struct.unpack(
-                structure, self.image_file.read(bytesPerRead))[0])
-            read += bytesPerRead
+        raw = self.image_file.read(totalBytes)
+        read += totalBytes
         if returnPos > 0:
             self.image_file.seek(returnPos+4)
-        while ((slotSize != None) and (read < slotSize)):
-            self.image_file.read(1)
-            read += 1
-
-        if typeData in [5, 10]:
-            i = 0
-            returnValues = []
-            while (i < len(data)):
-                returnValues.append(data[i]/data[i+1])
-                i += 2
-            if len(returnValues) > 1:
-                return returnValues
-            else:
-                return returnValues[0]
-        if typeData in [2]:
-            auxString=""
-            for value in data:
-                auxString += str(value)[2:-1]
-            return auxString[0:-4]
-        if len(data) > 1:
-            return data
-        else:
-            return data[0]
+        if (slotSize != None) and (read < slotSize):
+            self.image_file.seek(slotSize-read, os.SEEK_CUR)
+        return unpackTIFFData(self.direction, typeData, count, raw)
 
 
 class NEFImage(TIFFImage):
-    def __init__(self, imagePath):
+    def __init__(self, imagePath, readMode="file", reader=None):
         self.fileName = os.path.basename(imagePath)
         splitted = self.fileName.split(".")
         self.extension = splitted[-1].lower()
@@ -122,8 +493,14 @@ class NEFImage(TIFFImage):
         self.noExtName = emptyString.join(splitted[0:-1])
         # self.checkExtension()
         self.imagePath = imagePath
+        self.readMode = readMode
+        if reader is not None:
+            self._reader = reader
         self.findJSON()
-        self._tags=[]
+        self._ifds = {}
+        self._ifdLocations = {}
+        self._valueOffsets = {}
+        self._blobTags = {}
         self._numberOfTags=[]
         self.NoTIFFError = ValueError(
             f"{self.fileName} is not recognized as a TIFF file")
@@ -133,39 +510,57 @@ class NEFImage(TIFFImage):
             raise self.NoTIFFError
     
     def findJSON(self):
-        jsonPath = os.path.join(os.path.dirname(self.imagePath),"JSON",f"{self.noExtName}.JSON")
-        if os.path.isfile(jsonPath):
-            self.jsonPath=jsonPath
+        sidecar = SidecarStore.forDirectory(
+            os.path.join(os.path.dirname(self.imagePath),"JSON")).get(self.noExtName)
+        if sidecar != None:
+            self.sidecar = sidecar
+
+
+    @property
+    def reader(self):
+        if not hasattr(self, "_reader"):
+            if not self.readMode in READERS:
+                raise ValueError(f"Unknown read mode {self.readMode}")
+            self._reader = READERS[self.readMode](self.imagePath)
+        return self._reader
+
+    def readAt(self, offset, length):
+        return self.reader.read(offset, length)
+
+    @property
+    def bytesRead(self):
+        if hasattr(self, "_reader"):
+            return self._reader.bytesRead
+        return 0
 
+    def readTIFFDataAt(self, offset, typeData, count, direction=None):
+        """
+        readTIFFDataAt Reads "count" "typeData" values stored at "offset"
+
+        Unlike readTIFFData, the cursor of image_file is neither used nor moved.
+        """
+        return unpackTIFFData(direction or self.direction, typeData, count,
+                              self.readAt(offset, count*TIFF_TYPES[typeData][1]))
 
     @property
     def direction(self):
         if not hasattr(self, "_direction"):
-            pos = self.image_file.tell()
-            self.image_file.seek(0)
-            byteOrder = str(self.image_file.read(2))[2:-1]
-            if byteOrder == "II":
+            byteOrder = bytes(self.readAt(0, 2))
+            if byteOrder == b"II":
                 self._direction = "<"
-            elif byteOrder == "MM":
+            elif byteOrder == b"MM":
                 self._direction = ">"
             else:
                 raise self.NoTIFFError
-            self.image_file.seek(pos)
         return self._direction
 
     @property
     def image_file(self):
-        if not hasattr(self, "_image_file"):
-            self._image_file = open(f"{self.imagePath}", 'rb')
-        return self._image_file
+        return self.reader.file
 
     @property
     def verifiyDirection(self):
-        pos = self.image_file.tell()
-        self.image_file.seek(2)
-        result = self.readTIFFData(3,1)
-        self.image_file.seek(pos)
-        if result == 42:
+        if self.readTIFFDataAt(2, 3, 1) == 42:
             return 0
         else:
             raise self.NoTIFFError
@@ -173,136 +568,247 @@ class NEFImage(TIFFImage):
     @property
     def offsetFirstIFD(self):
         if not hasattr(self,"_offsetFirstIFD"):
-            pos = self.image_file.tell()
-            self.image_file.seek(4)
-            self._offsetFirstIFD = self.readTIFFData(4, 1)
-            self.image_file.seek(pos)
+            self._offsetFirstIFD = self.readTIFFDataAt(4, 4, 1)
         return self._offsetFirstIFD
 
     @property
     def firstIFD(self):
         if not hasattr(self,"_firstIFD"):
-            pos = self.image_file.tell()
-            self.image_file.seek(self.offsetFirstIFD)
-            self._firstIFD = self.readTIFFData(4, 1)
-            self.image_file.seek(pos)
+            self._firstIFD = self.readTIFFDataAt(self.offsetFirstIFD, 4, 1)
         return self._firstIFD
 
     @property
     def numberOfTagsFirstIFD(self):
         if not hasattr(self,"_numberOfTagsFirstIFD"):
-            pos = self.image_file.tell()
-            self.image_file.seek(self.offsetFirstIFD)
-            self._numberOfTagsFirstIFD = self.readTIFFData(3, 1)
-            self.image_file.seek(pos)
+            self._numberOfTagsFirstIFD = self.readTIFFDataAt(self.offsetFirstIFD, 3, 1)
         return self._numberOfTagsFirstIFD
 
     def getNumberOfTags(self, IFDId, offset):
         while len(self._numberOfTags)<(IFDId+1):
             self._numberOfTags.append(None)
         if self._numberOfTags[IFDId]==None:
-            pos = self.image_file.tell()
-            self.image_file.seek(offset)
-            self._numberOfTags[IFDId] = self.readTIFFData(3, 1)
-            self.image_file.seek(pos)
+            self._numberOfTags[IFDId] = self.readTIFFDataAt(offset, 3, 1)
         return self._numberOfTags[IFDId]
 
     @property
     def tagsFirstIFD(self):
-        if len(self._tags)==0:
-            self._tags.append(tagsIFD())
-            if hasattr(self, "jsonPath"):
-                with open(self.jsonPath, "r") as json_file:
-                    self._tags[0].__dict__.update(json.load(json_file))
+        if not hasattr(self, "_loadedTags") and not "IFD0" in self._ifds and hasattr(self, "sidecar"):
+            self.loadMetadata(self.sidecar)
+        if hasattr(self, "_loadedTags"):
+            return self._loadedTags
+        return self.ifd("IFD0")
+
+    @property
+    def tagsExifIFD(self):
+        if hasattr(self, "_loadedTags"):
+            # Merged into the loaded IFD0 tags
+            return tagsIFD()
+        return self.ifd("Exif") or tagsIFD()
+
+    def ifd(self, name):
+        """
+        ifd Returns the tags of the IFD "name", parsing it on first access only
+
+        Every IFD is reached lazily from the one pointing to it: asking for
+        "Exif" parses IFD0 and the EXIF IFD, nothing else.
+
+        :param name: "IFD0", "IFD1"... along the next IFD pointers,
+            "SubIFD0", "SubIFD1"... for the SubIFDs (tag 330) of IFD0, "Exif",
+            "GPS", "Interoperability" or "MakerNote" (Nikon maker notes, which
+            embed their own TIFF header)
+        :type name: str
+        :return: The IFD tags, None when the file has no such IFD
+        :rtype: tagsIFD
+        """
+        if not name in self._ifds:
+            location = self.locateIFD(name)
+            if location == None:
+                self._ifds[name] = None
             else:
-                self.readIFD(0, self.offsetFirstIFD, self.numberOfTagsFirstIFD)
+                offset, base, direction = location
+                numberOfTags = self.readTIFFDataAt(offset, 3, 1, direction)
+                self._ifdLocations[name] = location+(numberOfTags,)
+                self._valueOffsets[name] = {}
+                self._blobTags[name] = set()
+                self._ifds[name] = self.parseIFD(tagsIFD(), offset, numberOfTags, base, direction,
+                                                 self._valueOffsets[name],
+                                                 IFD_TAG_SCHEMAS.get(name, TAG_SCHEMA), self._blobTags[name])
+        return self._ifds[name]
+
+    def locateIFD(self, name):
+        """
+        locateIFD Returns the (offset, base, direction) of the IFD "name", see
+        ifd, or None. Offsets inside the IFD are relative to base and decoded
+        with the direction byte order.
+        """
+        pointers = {"Exif": ("IFD0", "Exif_IFD"), "GPS": ("IFD0", "GPSInfo"),
+                    "Interoperability": ("Exif", "Interoperability_IFD")}
+        if name == "IFD0":
+            return (self.offsetFirstIFD, 0, self.direction)
+        if name in pointers:
+            parent = self.ifd(pointers[name][0])
+            offset = getattr(parent, pointers[name][1], None) if parent != None else None
+            return (offset, 0, self.direction) if isinstance(offset, int) and offset > 0 else None
+        if name == "MakerNote":
+            return self.locateMakerNote()
+        for prefix in ["SubIFD", "IFD"]:
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                index = int(name[len(prefix):])
+                break
+        else:
+            raise KeyError(f"Unknown IFD {name}")
+        if prefix == "SubIFD":
+            subIFDs = getattr(self.ifd("IFD0"), "SubIFDs", [])
+            if not isinstance(subIFDs, list):
+                subIFDs = [subIFDs]
+            return (subIFDs[index], 0, self.direction) if index < len(subIFDs) else None
+        if self.ifd(f"IFD{index-1}") == None:
+            return None
+        previous, base, direction, numberOfTags = self._ifdLocations[f"IFD{index-1}"]
+        offset = self.readTIFFDataAt(previous+2+numberOfTags*12, 4, 1, direction)
+        # A next IFD pointer going back to a known IFD would loop forever
+        if offset == 0 or any(location[0] == offset for location in self._ifdLocations.values()):
+            return None
+        return (offset, base, direction)
+
+    def locateMakerNote(self):
+        # Cameras store the MakerNote in the EXIF IFD, a few in IFD0
+        for parent in ["Exif", "IFD0"]:
+            if self.ifd(parent) != None and "MakerNote" in self._valueOffsets.get(parent, {}):
+                start = self._valueOffsets[parent]["MakerNote"]
+                break
+        else:
+            return None
+        header = bytes(self.readAt(start, 18))
+        if len(header) < 18 or header[0:6] != b"Nikon\x00" or not header[10:12] in [b"II", b"MM"]:
+            logging.debug(f"{self.fileName}: unsupported MakerNote format")
+            return None
+        direction = "<" if header[10:12] == b"II" else ">"
+        return (start+10+struct.unpack_from(direction+"L", header, 14)[0], start+10, direction)
+
+    def walkIFDs(self):
+        """
+        walkIFDs Yields the (name, tags) pairs of every IFD of the file, see ifd
+        """
+        for prefix in ["IFD", "SubIFD"]:
+            index = 0
+            while self.ifd(f"{prefix}{index}") != None:
+                yield (f"{prefix}{index}", self.ifd(f"{prefix}{index}"))
+                index += 1
+        for name in ["Exif", "GPS", "Interoperability", "MakerNote"]:
+            if self.ifd(name) != None:
+                yield (name, self.ifd(name))
 
-        return self._tags[0]
-    
+    @property
+    def metadata(self):
+        """
+        metadata IFD0 tags merged with the EXIF SubIFD ones, as stored in sidecars
 
-# @property
-#     def tagsFirstIFD(self):
-#         if not hasattr(self, "_tagsFirstIFD"):
-#             self._tagsFirstIFD=tagsIFD()
-#             if hasattr(self, "jsonPath"):
-#                 with open(self.jsonPath, "r") as json_file:
-#                     self._tagsFirstIFD.__dict__.update(json.load(json_file))
-#             else:
-#                 pos = self.image_file.tell()
-#                 for tagIndex in range(self.numberOfTagsFirstIFD):
-#                     self.image_file.seek(self.offsetFirstIFD+2+tagIndex*12)
-#                     tag = 0
-#                     while tag == 0:
-#                         tag = self.readTIFFData(3, 1)
-#                     if tag != 0:
-#                         tag_type=self.readTIFFData(3,1)
-#                         tag_count=self.readTIFFData(4,1)
-#                         tag_value=self.readTIFFData(tag_type, tag_count, slotSize=4)
-#                         if isinstance(tag_value, str):
-#                             tag_value=tag_value.replace("\'", "\\\'")
-#                             tag_value=tag_value.replace("\"", "\\\"")
-#                             string=f"self._tagsFirstIFD.{self.tags[tag]} = \'{tag_value}\'"
-#                         else:
-#                             string=f"self._tagsFirstIFD.{self.tags[tag]} = {tag_value}"
-#                         exec(string)
-#                 self.image_file.seek(pos)
-#         return self._tagsFirstIFD
-    
+        UNDEFINED blobs (MakerNote, UserComment...) are left out: they are
+        read from the picture when needed, see ifd.
+        """
+        metadata = dict(self.tagsExifIFD.__dict__)
+        metadata.update(self.tagsFirstIFD.__dict__)
+        for name in self._blobTags.get("IFD0", set()) | self._blobTags.get("Exif", set()):
+            metadata.pop(name, None)
+        return metadata
+
+    def loadMetadata(self, metadata):
+        """
+        loadMetadata Uses an already parsed metadata dict, as given by the
+        metadata property, instead of reading the file
+
+        The loaded tags only stand for tagsFirstIFD and tagsExifIFD: the IFD
+        graph (ifd, walkIFDs, previews, pixels) is still parsed from the file
+        when asked for.
+        """
+        self._loadedTags = tagsIFD()
+        self._loadedTags.__dict__.update(metadata)
 
+    @property
+    def dateTimeOriginal(self):
+        if hasattr(self.tagsFirstIFD, "DateTimeOriginal"):
+            return self.tagsFirstIFD.DateTimeOriginal
+        if hasattr(self.tagsExifIFD, "DateTimeOriginal"):
+            return self.tagsExifIFD.DateTimeOriginal
+    
 
     def readIFD(self,IFDId, offset, numberOfTags):
-        while len(self._tags)<(IFDId+1):
-            self._tags.append(tagsIFD())
-        pos = self.image_file.tell()
+        name = f"IFD{IFDId}"
+        self._ifdLocations.setdefault(name, (offset, 0, self.direction, numberOfTags))
+        return self.parseIFD(self._ifds.setdefault(name, tagsIFD()), offset, numberOfTags,
+                             valueOffsets=self._valueOffsets.setdefault(name, {}),
+                             blobTags=self._blobTags.setdefault(name, set()))
+
+    def parseIFD(self, record, offset, numberOfTags, base=0, direction=None, valueOffsets=None,
+                 schema=TAG_SCHEMA, blobTags=None):
+        """
+        parseIFD Decodes the "numberOfTags" entries of the IFD at "offset" into
+        record, naming them after the "schema" tag table (see IFD_TAG_SCHEMAS)
+
+        Value offsets are relative to "base" and decoded with the "direction"
+        byte order (those of the file by default). The absolute offset of every
+        value stored outside the entry table is saved in the valueOffsets dict
+        when one is given, and the names of those of type UNDEFINED in the
+        blobTags set.
+        """
+        direction = direction or self.direction
+        entries = self.readAt(offset+2, numberOfTags*12)
         for tagIndex in range(numberOfTags):
-            self.image_file.seek(offset+2+tagIndex*12)
-            tag = 0
-            while tag == 0:
-                tag = self.readTIFFData(3, 1)
-            if tag != 0:
-                tag_type=self.readTIFFData(3,1)
-                tag_count=self.readTIFFData(4,1)
-                tag_value=self.readTIFFData(tag_type, tag_count, slotSize=4)
-                if isinstance(tag_value, str):
-                    tag_value=tag_value.replace("\'", "\\\'")
-                    tag_value=tag_value.replace("\"", "\\\"")
-                    string=f"self._tags[{IFDId}].{self.tags[tag]} = \'{tag_value}\'"
-                else:
-                    string=f"self._tags[{IFDId}].{self.tags[tag]} = {tag_value}"
-                exec(string)
-        self.image_file.seek(pos)
-        return self._tags[IFDId]
+            tag, tag_type, tag_count = struct.unpack_from(
+                direction+"HHL", entries, tagIndex*12)
+            if not tag_type in TIFF_TYPES:
+                logging.debug(f"{self.fileName}: tag {tag} has unknown type {tag_type}")
+                continue
+            totalBytes = tag_count*TIFF_TYPES[tag_type][1]
+            spec = tagSpec(tag, schema)
+            if totalBytes > 4:
+                valueOffset = base+struct.unpack_from(direction+"L", entries, tagIndex*12+8)[0]
+                if valueOffsets != None:
+                    valueOffsets[spec.name] = valueOffset
+                if blobTags != None and tag_type == 7:
+                    blobTags.add(spec.name)
+                tag_value = self.readTIFFDataAt(valueOffset, tag_type, tag_count, direction)
+            else:
+                tag_value = unpackTIFFData(direction, tag_type, tag_count,
+                                           entries, tagIndex*12+8)
+            if spec.types != None and not tag_type in spec.types:
+                logging.debug(f"{self.fileName}: {spec.name} stored as type {tag_type}")
+            elif spec.converter != None and not isinstance(tag_value, list):
+                tag_value = spec.converter(tag_value)
+            setattr(record, spec.name, tag_value)
+        return record
 
 
     @property
     def capyear(self):
-        if hasattr(self.tagsFirstIFD, "DateTimeOriginal"):
-            return self.tagsFirstIFD.DateTimeOriginal.split(" ")[0].split(":")[0]
+        if self.dateTimeOriginal != None:
+            return self.dateTimeOriginal.split(" ")[0].split(":")[0]
             
     @property
     def capmonth(self):
-        if hasattr(self.tagsFirstIFD, "DateTimeOriginal"):
-            return self.tagsFirstIFD.DateTimeOriginal.split(" ")[0].split(":")[1]
+        if self.dateTimeOriginal != None:
+            return self.dateTimeOriginal.split(" ")[0].split(":")[1]
 
     @property
     def capday(self):
-        if hasattr(self.tagsFirstIFD, "DateTimeOriginal"):
-            return self.tagsFirstIFD.DateTimeOriginal.split(" ")[0].split(":")[2]
+        if self.dateTimeOriginal != None:
+            return self.dateTimeOriginal.split(" ")[0].split(":")[2]
 
     @property
     def capdhour(self):
-        if hasattr(self.tagsFirstIFD, "DateTimeOriginal"):
-            return self.tagsFirstIFD.DateTimeOriginal.split(" ")[1].split(":")[0]
+        if self.dateTimeOriginal != None:
+            return self.dateTimeOriginal.split(" ")[1].split(":")[0]
 
     @property
     def capmin(self):
-        if hasattr(self.tagsFirstIFD, "DateTimeOriginal"):
-            return self.tagsFirstIFD.DateTimeOriginal.split(" ")[1].split(":")[2]
+        if self.dateTimeOriginal != None:
+            return self.dateTimeOriginal.split(" ")[1].split(":")[2]
 
     @property
     def capsec(self):
-        if hasattr(self.tagsFirstIFD, "DateTimeOriginal"):
-            return self.tagsFirstIFD.DateTimeOriginal.split(" ")[1].split(":")[2]
+        if self.dateTimeOriginal != None:
+            return self.dateTimeOriginal.split(" ")[1].split(":")[2]
 
     @property
     def capdevice(self):
@@ -311,11 +817,11 @@ class NEFImage(TIFFImage):
 
 
     def createJSON (self, outpath=""):
-        if not os.path.isdir(outpath): os.mkdir(outpath)
-        if outpath!="": outFile = outpath+"/"+self.noExtName
-        else: outFile=self.noExtName
-        with open(f'{outFile}.json', 'w') as outfile:
-            json.dump(self.tagsFirstIFD.__dict__, outfile, indent=4, sort_keys=True)
+        """
+        createJSON Appends the metadata of the picture to the sidecar store of
+        the "outpath" folder, see SidecarStore
+        """
+        SidecarStore.forDirectory(outpath or ".").append(self.noExtName, self.metadata)
 
     def relocatePath(self,outputRootPath="", parameters=[]):
         valid_parameters = ["capyear", "capmonth", "capday",
@@ -331,10 +837,165 @@ class NEFImage(TIFFImage):
         return outpath
 
     def readContent(self,IFDId):
-        if hasattr(self._tags[IFDId],"StripOffsets") and hasattr(self._tags[IFDId],"StripByteCounts"):            
-            self.image_file.seek(self._tags[IFDId].StripOffsets)
-            return self.readTIFFData(1,self._tags[IFDId].StripByteCounts)
-            #return self.image_file.read(self._tags[IFDId].StripByteCounts)
+        """
+        readContent Returns the strip data of the IFD "IFDId", an index along
+        the next IFD pointers or any IFD name accepted by ifd
+
+        In "mmap" read mode the result is a zero-copy memoryview on the mapped
+        file as long as the strips are stored back to back.
+        """
+        tags = self.ifd(IFDId if isinstance(IFDId, str) else f"IFD{IFDId}")
+        if hasattr(tags,"StripOffsets") and hasattr(tags,"StripByteCounts"):
+            stripOffsets = tags.StripOffsets
+            stripByteCounts = tags.StripByteCounts
+            if not isinstance(stripOffsets, list):
+                return self.readAt(stripOffsets, stripByteCounts)
+            contiguous = all(offset+count == nextOffset for offset, count, nextOffset
+                             in zip(stripOffsets, stripByteCounts, stripOffsets[1:]))
+            if contiguous:
+                return self.readAt(stripOffsets[0], sum(stripByteCounts))
+            return b"".join(self.readAt(offset, count)
+                            for offset, count in zip(stripOffsets, stripByteCounts))
+
+    def readPixels(self, IFDId=0):
+        """
+        readPixels Decodes the uncompressed strips or tiles of an IFD into a
+        NumPy array shaped (ImageLength, ImageWidth, SamplesPerPixel)
+
+        The array is allocated once and every strip or tile is copied in
+        with a single vectorized assignment, honouring BitsPerSample (8, 16,
+        32 or 64), SampleFormat, PlanarConfiguration and the byte order of
+        the file. NumPy is only imported when this method is used.
+
+        :param IFDId: An index along the next IFD pointers or any IFD name
+            accepted by ifd, by default 0
+        :type IFDId: int, str, optional
+        :return: The pixels, in the native byte order
+        :rtype: numpy.ndarray
+        """
+        import numpy
+        name = IFDId if isinstance(IFDId, str) else f"IFD{IFDId}"
+        tags = self.ifd(name)
+        if tags == None or not hasattr(tags, "ImageWidth") or not hasattr(tags, "ImageLength"):
+            raise ValueError(f"{self.fileName}: {name} holds no image")
+        if getattr(tags, "Compression", 1) != 1:
+            raise ValueError(f"{self.fileName}: {name} is compressed ({tags.Compression})")
+        width, length = tags.ImageWidth, tags.ImageLength
+        samples = getattr(tags, "SamplesPerPixel", 1)
+        bits = getattr(tags, "BitsPerSample", 1)
+        bits = set(bits) if isinstance(bits, list) else {bits}
+        sampleFormat = getattr(tags, "SampleFormat", 1)
+        sampleFormat = set(sampleFormat) if isinstance(sampleFormat, list) else {sampleFormat}
+        if len(bits) != 1 or not min(bits) in [8, 16, 32, 64] or len(sampleFormat) != 1:
+            raise ValueError(f"{self.fileName}: unsupported BitsPerSample {sorted(bits)}")
+        kind = {1: "u", 2: "i", 3: "f"}.get(min(sampleFormat))
+        if kind == None or (kind == "f" and min(bits) < 16):
+            raise ValueError(f"{self.fileName}: unsupported SampleFormat {sorted(sampleFormat)}")
+        fileType = numpy.dtype(f"{self.direction}{kind}{min(bits)//8}")
+        pixels = numpy.empty((length, width, samples), dtype=fileType.newbyteorder("="))
+        planar = getattr(tags, "PlanarConfiguration", 1) == 2
+        planeSamples = 1 if planar else samples
+
+        def asList(value):
+            return value if isinstance(value, list) else [value]
+
+        if hasattr(tags, "TileOffsets"):
+            tileWidth, tileLength = tags.TileWidth, tags.TileLength
+            blockOffsets, blockByteCounts = asList(tags.TileOffsets), asList(tags.TileByteCounts)
+            across = -(-width//tileWidth)
+            blocksPerPlane = across*-(-length//tileLength)
+        else:
+            tileWidth = width
+            tileLength = min(getattr(tags, "RowsPerStrip", length), length)
+            blockOffsets, blockByteCounts = asList(tags.StripOffsets), asList(tags.StripByteCounts)
+            across = 1
+            blocksPerPlane = -(-length//tileLength)
+        for index, (offset, byteCount) in enumerate(zip(blockOffsets, blockByteCounts)):
+            plane, block = divmod(index, blocksPerPlane)
+            top, left = (block//across)*tileLength, (block % across)*tileWidth
+            if top >= length:
+                continue
+            # The last strip only holds the remaining rows; tiles are padded
+            rows = tileLength if hasattr(tags, "TileOffsets") else min(tileLength, length-top)
+            data = numpy.frombuffer(self.readAt(offset, byteCount), dtype=fileType,
+                                    count=rows*tileWidth*planeSamples).reshape(rows, tileWidth, planeSamples)
+            rows, columns = min(rows, length-top), min(tileWidth, width-left)
+            target = pixels[top:top+rows, left:left+columns]
+            if planar:
+                target[:, :, plane] = data[0:rows, 0:columns, 0]
+            else:
+                target[:] = data[0:rows, 0:columns]
+            del data
+        return pixels
+
+    @property
+    def previews(self):
+        """
+        previews PreviewInfo of every JPEG embedded in the IFD chain or the
+        SubIFDs, smallest first
+
+        IFDs qualify through JPEGInterchangeFormat (NEF thumbnails) or through
+        a JPEG compressed (6 or 7) single strip (NEF and DNG full size
+        previews). Only the head of each stream is read, to check the JPEG
+        start of image marker and, when the IFD does not state them, to find
+        the dimensions.
+        """
+        if not hasattr(self, "_previews"):
+            self._previews = []
+            for prefix in ["IFD", "SubIFD"]:
+                index = 0
+                while self.ifd(f"{prefix}{index}") != None:
+                    name = f"{prefix}{index}"
+                    tags = self.ifd(name)
+                    index += 1
+                    if hasattr(tags, "JPEGInterchangeFormat") and hasattr(tags, "JPEGInterchangeFormatLength"):
+                        offset, length = tags.JPEGInterchangeFormat, tags.JPEGInterchangeFormatLength
+                    elif (getattr(tags, "Compression", None) in [6, 7]
+                          and isinstance(getattr(tags, "StripOffsets", None), int)
+                          and isinstance(getattr(tags, "StripByteCounts", None), int)):
+                        offset, length = tags.StripOffsets, tags.StripByteCounts
+                    else:
+                        continue
+                    width, height = getattr(tags, "ImageWidth", None), getattr(tags, "ImageLength", None)
+                    head = self.readAt(offset, 2 if width and height else min(length, JPEG_HEADER_SIZE))
+                    if bytes(head[0:2]) != b"\xff\xd8":
+                        logging.debug(f"{self.fileName}: {name} does not hold a JPEG stream")
+                        continue
+                    if not (width and height):
+                        width, height = jpegSize(head)
+                    self._previews.append(PreviewInfo(name, offset, length, width, height))
+            self._previews.sort(key=lambda preview: ((preview.width or 0)*(preview.height or 0), preview.length))
+        return self._previews
+
+    def preview(self, size=None):
+        """
+        preview Returns the bytes of an embedded JPEG preview without
+        decoding the RAW data
+
+        In "mmap" read mode the result is a zero-copy memoryview on the mapped
+        file. Previews of unknown dimensions are ranked by their byte length.
+
+        :param size: Smallest acceptable length of the longest side, by
+            default None for the largest preview
+        :type size: int, optional
+        :return: The JPEG stream, None when the file embeds no preview
+        :rtype: bytes, memoryview
+        """
+        previews = self.previews
+        if len(previews) == 0:
+            return None
+        chosen = previews[-1]
+        if size != None:
+            for preview in previews:
+                if max(preview.width or 0, preview.height or 0) >= size:
+                    chosen = preview
+                    break
+        return self.readAt(chosen.offset, chosen.length)
+
+    def close(self):
+        if hasattr(self, "_reader"):
+            self._reader.close()
+            del self._reader
 
 # import matplotlib.pyplot as plt
 # import matplotlib.image as mpimg
@@ -342,13 +1003,7 @@ class NEFImage(TIFFImage):
 # t=time.time_ns()
 # imagen=NEFImage("00 test_images/test3.NEF")
 # print(imagen.tagsFirstIFD.RowsPerStrip)
-# data = imagen.readContent(0)
-# matrix=[]
-# for j in range(120):
-#     row = []
-#     for i in range (160):
-#         row.append(np.array([data[j*i*3],data[j*i*3+1],data[j*i*3+2]]))
-#     matrix.append(np.array(row))
+# matrix = imagen.readPixels(0)
 # # with open(f"test{0}.tiff","w+") as file:
 # #     file.write(data)
 
@@ -356,23 +1011,8 @@ class NEFImage(TIFFImage):
 # plt.imshow(image)
 # plt.show()
 
-# '''
-# import numpy as np
 # import matplotlib.pyplot as plt
-# imagePath="00 test_images/test2.tiff"
-# imagen=NEFImage(imagePath)
+# imagen=NEFImage("00 test_images/test2.tiff", "mmap")
 # print(imagen.tagsFirstIFD.__dict__)
-# matrix = []
-# data2 = imagen.readContent(0)
-# print("data2 loaded")
-# for j in range(imagen.tagsFirstIFD.ImageLength):
-#     row = []
-#     for i in range(imagen.tagsFirstIFD.ImageWidth):
-#         pixel=[]
-#         for k in range(imagen.tagsFirstIFD.SamplesPerPixel):
-#             pixel.append(data2[k+imagen.tagsFirstIFD.SamplesPerPixel*(i+j*imagen.tagsFirstIFD.ImageWidth)])
-#         row.append(pixel)
-#     matrix.append(row)
-# plotable = np.array(matrix)
-# plt.imshow(plotable)
-# plt.show()
\ No newline at end of file
+# plt.imshow(imagen.readPixels(0))
+# plt.show()
@@ -0,0 +1,119 @@
+"""
+Content based duplicate detection: size, then partial hash, then full hash.
+"""
+
+import hashlib
+import os
+import threading
+
+from lib import metadataindex
+
+# Bytes hashed at the start and at the end of a file by partialHash
+PARTIAL_SIZE = 64*1024
+HASH_CHUNK = 1024*1024
+
+
+def partialHash(path, size=None):
+    """
+    Cheap BLAKE2 digest of the size plus the first and last PARTIAL_SIZE
+    bytes of path. Equal full contents imply equal partial hashes.
+    """
+    if size is None:
+        size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as imageFile:
+        digest.update(imageFile.read(PARTIAL_SIZE))
+        if size > PARTIAL_SIZE:
+            imageFile.seek(max(PARTIAL_SIZE, size-PARTIAL_SIZE))
+            digest.update(imageFile.read(PARTIAL_SIZE))
+    return digest.hexdigest()
+
+
+def fullHash(path):
+    """
+    BLAKE2 digest of the whole content of path, read in HASH_CHUNK blocks.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as imageFile:
+        for chunk in iter(lambda: imageFile.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Deduplicator:
+    """
+    Detects files whose content was already seen.
+
+    Files are grouped by size and only hashed once another file of the same
+    size shows up: first with partialHash, then, if the partial hashes match,
+    with fullHash. Hashes are cached by (path, size, mtime_ns): partial ones
+    in memory, full ones in the MetadataIndex when one is given, so a file is
+    never hashed twice across runs while it is unchanged.
+    """
+
+    def __init__(self, index=None):
+        self.index = index
+        self.lock = threading.Lock()
+        self.sizeLocks = {}
+        self.bySize = {}
+        self.partialHashes = {}
+        self.fullHashes = {}
+        self.hashed = {"partial": 0, "full": 0}
+
+    def partialHash(self, key):
+        if not key in self.partialHashes:
+            self.partialHashes[key] = partialHash(key[0], key[1])
+            with self.lock:
+                self.hashed["partial"] += 1
+        return self.partialHashes[key]
+
+    def fullHash(self, key):
+        if not key in self.fullHashes:
+            contentHash = self.index.contentHash(key[0]) if self.index else None
+            if contentHash is None:
+                contentHash = fullHash(key[0])
+                with self.lock:
+                    self.hashed["full"] += 1
+                if self.index:
+                    self.index.setContentHash(*key, contentHash)
+            self.fullHashes[key] = contentHash
+        return self.fullHashes[key]
+
+    def knownHash(self, key):
+        """
+        Returns the full hash of the (path, size, mtime_ns) key when it was
+        already computed or indexed, without hashing anything.
+        """
+        if key in self.fullHashes:
+            return self.fullHashes[key]
+        return self.index.contentHash(key[0]) if self.index else None
+
+    def duplicateOf(self, path, stat=None):
+        """
+        Returns the path of a previously seen file with the same content as
+        path, or None after remembering path as an original.
+        """
+        key = metadataindex.statKey(path, stat)
+        with self.lock:
+            sizeLock = self.sizeLocks.setdefault(key[1], threading.Lock())
+        # Files of different sizes never compare, so they are checked in parallel
+        with sizeLock:
+            candidates = self.bySize.setdefault(key[1], [])
+            for candidate in candidates:
+                if candidate[0] == key[0]:
+                    return None
+                if (self.partialHash(candidate) == self.partialHash(key)
+                        and self.fullHash(candidate) == self.fullHash(key)):
+                    return candidate[0]
+            candidates.append(key)
+        return None
+
+    def sameContent(self, path, otherPath):
+        """
+        Tells whether two files have the same content, hashing as little as possible.
+        """
+        key, otherKey = metadataindex.statKey(path), metadataindex.statKey(otherPath)
+        if key[1] != otherKey[1]:
+            return False
+        return (partialHash(path, key[1]) == partialHash(otherPath, otherKey[1])
+                and self.fullHash(key) == self.fullHash(otherKey))
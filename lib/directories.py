@@ -0,0 +1,71 @@
+"""
+Destination directory planning: every folder is created once per process.
+"""
+
+import logging
+import os
+import threading
+
+
+class DirectoryPlanner:
+    """
+    Creates destination folders in batches and remembers them.
+
+    Folders already created (or found) by this planner, and their parents,
+    are kept in a set, so placing a file in a known folder costs no system
+    call at all.
+    """
+
+    def __init__(self):
+        self.created = set()
+        self.lock = threading.Lock()
+        self.log = logging.getLogger("DirectoryPlanner")
+
+    def prepare(self, directories):
+        """
+        Creates the missing directories in sorted order, parents first.
+
+        Returns a {directory: OSError} dict of the folders that could not be
+        created, keyed as given.
+        """
+        pending = {}
+        for directory in directories:
+            normalized = os.path.normpath(directory)
+            if not normalized in self.created:
+                pending.setdefault(normalized, []).append(directory)
+        errors = {}
+        if not pending:
+            return errors
+        with self.lock:
+            for normalized in sorted(pending):
+                if normalized in self.created:
+                    continue
+                try:
+                    os.makedirs(normalized, exist_ok=True)
+                except OSError as makedirs_e:
+                    self.log.error("Error creating %s. Reason: %s", normalized, makedirs_e)
+                    errors.update((directory, makedirs_e) for directory in pending[normalized])
+                    continue
+                while not normalized in self.created and os.path.dirname(normalized) != normalized:
+                    self.created.add(normalized)
+                    normalized = os.path.dirname(normalized)
+        return errors
+
+    def ensure(self, directory):
+        """
+        Creates directory unless it is already known, raising its OSError.
+        """
+        errors = self.prepare([directory])
+        if errors:
+            raise errors[directory]
+
+    def forget(self, directories=None):
+        """
+        Drops directories (all of them by default) from the cache, e.g. after
+        deleting them.
+        """
+        with self.lock:
+            if directories is None:
+                self.created.clear()
+            else:
+                self.created.difference_update(os.path.normpath(directory) for directory in directories)
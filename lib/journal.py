@@ -0,0 +1,109 @@
+"""
+Append-only journal of completed relocations, used to resume interrupted runs.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import CommonVariables
+
+
+def pathFor(pipeline, scope=""):
+    """
+    Returns the journal file of pipeline (e.g. "organizer", "scan" or
+    "plan") for scope, e.g. an output root or a plan file, under
+    CommonVariables.journalDir. Sources are journaled without their
+    destination tree, so runs of different pipelines or into different
+    trees must never share a journal.
+    """
+    name = pipeline
+    if scope != "":
+        name += "-"+hashlib.blake2b(scope.encode(), digest_size=8).hexdigest()
+    return os.path.join(CommonVariables.journalDir, name+".jsonl")
+
+
+class RelocationJournal:
+    """
+    JSON-lines log of the relocations done by a run, one
+    {"source": ..., "destination": ...} object per line.
+
+    Entries are written and fsync'ed in batches of syncEvery, so a crash
+    loses at most the last batch, which is then simply redone. The entries
+    already journaled are loaded once, when the journal is opened, and
+    checked in memory: resuming needs no stat nor parse of completed files.
+    """
+
+    def __init__(self, journalPath, syncEvery=None):
+        """
+        Args:
+            - journalPath (string): journal file, see pathFor.
+            - syncEvery (int): entries per fsync'ed batch, by default
+                               CommonVariables.journalSyncEvery.
+        """
+        self.journalPath = journalPath
+        self.syncEvery = syncEvery or CommonVariables.journalSyncEvery
+        self.pending = []
+        self.lock = threading.Lock()
+        self.completed = self.load()
+
+    def load(self):
+        """
+        Returns the dict of the journaled destination of every source.
+        """
+        completed = {}
+        if not os.path.exists(self.journalPath):
+            return completed
+        with open(self.journalPath, "r") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                    completed[entry["source"]] = entry["destination"]
+                except (ValueError, KeyError, TypeError):
+                    # Last line cut by a crash
+                    continue
+        return completed
+
+    def isDone(self, source, destination=None):
+        """
+        Tells whether source was relocated, to destination when one is given.
+        """
+        source = os.path.abspath(source)
+        if destination != None:
+            return self.completed.get(source) == destination
+        return source in self.completed
+
+    def record(self, source, destination):
+        source = os.path.abspath(source)
+        with self.lock:
+            self.completed[source] = destination
+            self.pending.append(json.dumps({"source": source, "destination": destination}))
+            full = len(self.pending) >= self.syncEvery
+        if full:
+            self.sync()
+
+    def sync(self):
+        """
+        Appends the pending entries and waits for them to reach the disk.
+        """
+        with self.lock:
+            if len(self.pending) == 0:
+                return
+            if os.path.dirname(self.journalPath) != "":
+                os.makedirs(os.path.dirname(self.journalPath), exist_ok=True)
+            with open(self.journalPath, "a") as journal:
+                journal.write("\n".join(self.pending)+"\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+            self.pending = []
+
+    def clear(self):
+        """
+        Forgets every entry, once a run completed.
+        """
+        with self.lock:
+            self.pending = []
+            self.completed = {}
+            if os.path.exists(self.journalPath):
+                os.remove(self.journalPath)
@@ -0,0 +1,141 @@
+"""
+Persistent metadata index, keyed by path, size and modification time.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+import CommonVariables
+
+# Values holding more items than this (MakerNote blobs, strip tables...) are
+# not stored: the index is meant for the fields the organizer relies on.
+MAX_LIST_VALUES = 64
+
+# Kinds of metadata, each stored in its own table since the same file gets
+# different entries from each consumer: NEFImage IFD dicts (the organizer
+# scheduler) and EXIF summaries (dev/image-organizer.py)
+TIFF_METADATA = "tiff"
+EXIF_SUMMARY = "exif"
+KINDS = (TIFF_METADATA, EXIF_SUMMARY)
+
+
+def statKey(path, stat=None):
+    """
+    Returns the (path, size, mtime_ns) key of path, stat being an optional
+    os.stat_result or os.DirEntry.stat() already at hand.
+    """
+    if stat is None:
+        stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+class MetadataIndex:
+    """
+    SQLite cache of parsed picture metadata.
+
+    An entry is only valid for the size and mtime_ns it was stored with, so a
+    modified file misses the cache and gets re-parsed. Connections are
+    opened per thread; writes are serialized and batched with upsertMany.
+    Entries of each kind (see KINDS) live in their own table.
+    """
+
+    def __init__(self, dbPath=None, kind=TIFF_METADATA):
+        if not kind in KINDS:
+            raise ValueError(f"Unknown metadata kind {kind}")
+        self.dbPath = dbPath or CommonVariables.metadataIndexPath
+        self.table = f"{kind}_metadata"
+        if os.path.dirname(self.dbPath) != "":
+            os.makedirs(os.path.dirname(self.dbPath), exist_ok=True)
+        self.local = threading.local()
+        self.writeLock = threading.Lock()
+        with self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "content_hash TEXT, metadata TEXT)")
+
+    @property
+    def connection(self):
+        if not hasattr(self.local, "connection"):
+            self.local.connection = sqlite3.connect(self.dbPath, timeout=30)
+            self.local.connection.execute("PRAGMA journal_mode=WAL")
+            self.local.connection.execute("PRAGMA synchronous=NORMAL")
+        return self.local.connection
+
+    def lookup(self, path, stat=None):
+        """
+        Returns the metadata dict stored for path, or None when the file is
+        not indexed or changed since it was.
+        """
+        row = self.connection.execute(
+            f"SELECT metadata FROM {self.table} WHERE path=? AND size=? AND mtime_ns=?",
+            statKey(path, stat)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def contentHash(self, path, stat=None):
+        """
+        Returns the content hash stored for the current version of path, if any.
+        """
+        row = self.connection.execute(
+            f"SELECT content_hash FROM {self.table} WHERE path=? AND size=? AND mtime_ns=?",
+            statKey(path, stat)).fetchone()
+        return row[0] if row else None
+
+    def upsertMany(self, rows):
+        """
+        Stores a batch of entries in a single transaction.
+
+        Args:
+            - rows (iterable): (path, size, mtime_ns, metadata) or
+                               (path, size, mtime_ns, metadata, contentHash)
+                               tuples, metadata being a dict.
+        """
+        values = []
+        for row in rows:
+            path, size, mtime_ns, metadata = row[0:4]
+            contentHash = row[4] if len(row) > 4 else None
+            values.append((os.path.abspath(path), size, mtime_ns, contentHash,
+                           None if metadata is None else json.dumps(compactMetadata(metadata))))
+        # A content hash already stored for the same file version is kept
+        with self.writeLock, self.connection:
+            self.connection.executemany(
+                f"INSERT INTO {self.table} VALUES (?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+                "content_hash=CASE WHEN excluded.content_hash IS NOT NULL THEN excluded.content_hash "
+                "WHEN size=excluded.size AND mtime_ns=excluded.mtime_ns THEN content_hash END, "
+                "size=excluded.size, mtime_ns=excluded.mtime_ns, metadata=excluded.metadata", values)
+
+    def setContentHash(self, path, size, mtime_ns, contentHash):
+        """
+        Stores the content hash of a file version, keeping its metadata when
+        that version is already indexed.
+        """
+        key = (os.path.abspath(path), size, mtime_ns)
+        with self.writeLock, self.connection:
+            updated = self.connection.execute(
+                f"UPDATE {self.table} SET content_hash=? WHERE path=? AND size=? AND mtime_ns=?",
+                (contentHash,)+key).rowcount
+            if updated == 0:
+                self.connection.execute(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, NULL)", key+(contentHash,))
+
+    def invalidate(self, paths):
+        """
+        Drops the entries of paths, e.g. after moving or deleting the files.
+        """
+        with self.writeLock, self.connection:
+            self.connection.executemany(
+                f"DELETE FROM {self.table} WHERE path=?", [(os.path.abspath(path),) for path in paths])
+
+    def close(self):
+        if hasattr(self.local, "connection"):
+            self.local.connection.close()
+            del self.local.connection
+
+
+def compactMetadata(metadata):
+    return {name: value for name, value in metadata.items()
+            if not (isinstance(value, list) and len(value) > MAX_LIST_VALUES)}
@@ -0,0 +1,350 @@
+"""
+Parallel scheduler behind the drag and drop organizer.
+"""
+
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+import CommonVariables
+from dev import tiffreader
+from lib import directories, journal, metadataindex
+
+ORGANIZE_PARAMETERS = ["capyear", "capmonth", "capday", "capdevice"]
+
+# Metadata indexes opened by this process, by database path
+indexes = {}
+
+
+def workerIndex(indexPath):
+    if not indexPath in indexes:
+        indexes[indexPath] = metadataindex.MetadataIndex(indexPath)
+    return indexes[indexPath]
+
+
+def parsePictures(imagePaths, parameters, indexPath=None):
+    """
+    Parses the metadata of a chunk of pictures. Runs in a worker process.
+
+    Pictures found unchanged in the metadata index are not read at all.
+    Files that are not TIFF files are indexed with an empty metadata dict so
+    that they are skipped without being read again either.
+
+    Args:
+        - imagePaths (list): paths of the pictures to parse.
+        - parameters (list): relocation parameters, as per NEFImage.relocatePath.
+        - indexPath (string): metadata index database, None to disable it.
+
+    Returns a tuple (results, indexRows, elapsed). results lists an
+    (imagePath, relPath, size, error) tuple per picture: relPath is None for
+    skipped pictures, that is files not recognized as TIFF files, and error
+    holds the reason of a failure. indexRows are the entries to add to the
+    metadata index and elapsed is the time spent on the chunk, in seconds.
+    """
+    started = time.perf_counter()
+    index = workerIndex(indexPath) if indexPath else None
+    results, indexRows = [], []
+    for imagePath in imagePaths:
+        relPath, size, error, NEF = None, 0, None, None
+        try:
+            stat = os.stat(imagePath)
+            size = stat.st_size
+            cached = index.lookup(imagePath, stat) if index else None
+            if cached != {}:
+                NEF = tiffreader.NEFImage(imagePath, readMode="header")
+                try:
+                    if cached != None:
+                        NEF.loadMetadata(cached)
+                    relPath = NEF.relocatePath(os.path.dirname(NEF.imagePath), parameters)
+                    if cached == None and index:
+                        indexRows.append(metadataindex.statKey(imagePath, stat)+(NEF.metadata,))
+                finally:
+                    NEF.close()
+        except ValueError as value_e:
+            if NEF != None and value_e is NEF.NoTIFFError:
+                if index:
+                    indexRows.append(metadataindex.statKey(imagePath, stat)+({},))
+            else:
+                error = f"{os.path.basename(imagePath)}: {value_e}"
+        except Exception as read_e:
+            # Any failure, e.g. a blank DateTimeOriginal, only fails this picture
+            error = f"{os.path.basename(imagePath)}: {read_e!r}"
+        results.append((imagePath, relPath, size, error))
+    return (results, indexRows, time.perf_counter()-started)
+
+
+class OrganizerProgress:
+    """
+    Thread safe counters of an organizer run.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lastReport = 0
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.total, self.placed, self.failed, self.skipped, self.cancelled = 0, 0, 0, 0, 0
+        self.resumed = 0
+        self.bytesPlaced = 0
+        self.parseSeconds, self.copySeconds = 0.0, 0.0
+
+    def add(self, **counters):
+        with self.lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name)+value)
+
+    @property
+    def done(self):
+        return self.placed+self.failed+self.skipped+self.cancelled+self.resumed
+
+    def snapshot(self, parseWorkers, copyWorkers):
+        """
+        Returns the counters along with the derived rates: files/s and MB/s
+        placed, the ETA in seconds (None until a first file is done) and the
+        share of time parse processes and copy threads were busy, which tells
+        whether a run is bound by CPU or by disk.
+        """
+        with self.lock:
+            elapsed = max(time.perf_counter()-self.started, 1e-6)
+            done = self.done
+            filesPerSecond = done/elapsed
+            return {
+                "total": self.total, "done": done, "placed": self.placed,
+                "failed": self.failed, "skipped": self.skipped, "cancelled": self.cancelled,
+                "resumed": self.resumed,
+                "elapsed": elapsed,
+                "filesPerSecond": filesPerSecond,
+                "mbPerSecond": self.bytesPlaced/elapsed/2**20,
+                "eta": (self.total-done)/filesPerSecond if done else None,
+                "parseLoad": min(self.parseSeconds/(elapsed*parseWorkers), 1.0),
+                "copyLoad": min(self.copySeconds/(elapsed*copyWorkers), 1.0),
+                "finished": done >= self.total,
+            }
+
+
+class OrganizerScheduler:
+    """
+    Fans metadata parsing out to a process pool and file placement out to a
+    bounded thread pool. Both pools are created on first use and reused by
+    every later submission until shutdown() is called.
+    """
+
+    def __init__(self, placePicture, parseWorkers=None, copyWorkers=None, chunkSize=None,
+                 progressCallback=None, progressInterval=None, indexPath=None, journalPath=None):
+        """
+        Args:
+            - placePicture (callable): called as placePicture(imagePath, relPath)
+                                       in a copy thread for every parsed picture.
+                                       The relPath folder already exists: the
+                                       scheduler creates the folders of each
+                                       parsed batch at once.
+            - parseWorkers (int): processes parsing metadata, by default
+                                  CommonVariables.parseWorkers (one per core if None).
+            - copyWorkers (int): threads placing files, by default
+                                 CommonVariables.copyWorkers.
+            - chunkSize (int): pictures parsed per process pool task, by default
+                               CommonVariables.parseChunkSize.
+            - progressCallback (callable): called from the worker threads with
+                                           an OrganizerProgress snapshot dict.
+            - progressInterval (float): minimum seconds between two progress
+                                        reports, by default
+                                        CommonVariables.progressInterval. The
+                                        last report of a run is always sent.
+            - indexPath (string): metadata index database, by default
+                                  CommonVariables.metadataIndexPath. An empty
+                                  string disables the index.
+            - journalPath (string): journal of the pictures placed, by default
+                                    journal.pathFor("organizer"). Pictures it
+                                    lists are counted as resumed instead of
+                                    being organized again; it is cleared once
+                                    a run completes without cancellations.
+                                    An empty string disables it.
+        """
+        self.placePicture = placePicture
+        self.parseWorkers = parseWorkers or CommonVariables.parseWorkers or os.cpu_count()
+        self.copyWorkers = copyWorkers or CommonVariables.copyWorkers
+        self.chunkSize = chunkSize or CommonVariables.parseChunkSize
+        self.progressCallback = progressCallback
+        self.progressInterval = progressInterval or CommonVariables.progressInterval
+        self.indexPath = CommonVariables.metadataIndexPath if indexPath is None else indexPath
+        self.journalPath = journal.pathFor("organizer") if journalPath is None else journalPath
+        self.progress = OrganizerProgress()
+        self.directories = directories.DirectoryPlanner()
+        self.cancelEvent = threading.Event()
+        self.pending = {}
+        self.pendingLock = threading.Lock()
+        self.log = logging.getLogger("Organizer")
+
+    @property
+    def parsePool(self):
+        if not hasattr(self, "_parsePool"):
+            self._parsePool = concurrent.futures.ProcessPoolExecutor(max_workers=self.parseWorkers)
+        return self._parsePool
+
+    @property
+    def index(self):
+        if not hasattr(self, "_index"):
+            self._index = metadataindex.MetadataIndex(self.indexPath)
+        return self._index
+
+    @property
+    def journal(self):
+        if not hasattr(self, "_journal"):
+            self._journal = journal.RelocationJournal(self.journalPath) if self.journalPath != "" else None
+        return self._journal
+
+    @property
+    def copyPool(self):
+        if not hasattr(self, "_copyPool"):
+            self._copyPool = concurrent.futures.ThreadPoolExecutor(max_workers=self.copyWorkers)
+        return self._copyPool
+
+    def submit(self, imagePaths, parameters=ORGANIZE_PARAMETERS):
+        """
+        Schedules the organization of imagePaths and returns immediately.
+
+        Submitting while a run is in progress adds to that run; otherwise a
+        new run starts with fresh counters.
+        """
+        with self.progress.lock:
+            if self.progress.done >= self.progress.total:
+                self.progress.reset()
+                self.cancelEvent.clear()
+            self.progress.total += len(imagePaths)
+        if len(imagePaths) == 0:
+            # Nothing will report the end of the run: report it now
+            self._update()
+            return
+        if self.journal != None:
+            resumed = len(imagePaths)
+            imagePaths = [imagePath for imagePath in imagePaths if not self.journal.isDone(imagePath)]
+            resumed -= len(imagePaths)
+            if resumed:
+                self._update(resumed=resumed)
+        for start in range(0, len(imagePaths), self.chunkSize):
+            chunk = imagePaths[start:start+self.chunkSize]
+            self._track(self.parsePool.submit(parsePictures, chunk, parameters, self.indexPath),
+                        len(chunk), self._parsed)
+
+    def cancel(self):
+        """
+        Drains the queues: pending parse and copy tasks are cancelled and the
+        running ones finish their current picture only.
+        """
+        self.cancelEvent.set()
+        with self.pendingLock:
+            pending = list(self.pending)
+        for future in pending:
+            future.cancel()
+
+    def _track(self, future, pictures, callback):
+        with self.pendingLock:
+            self.pending[future] = pictures
+        future.add_done_callback(callback)
+
+    def _untrack(self, future):
+        with self.pendingLock:
+            return self.pending.pop(future, 0)
+
+    def _parsed(self, future):
+        pictures = self._untrack(future)
+        if future.cancelled():
+            self._update(cancelled=pictures)
+            return
+        try:
+            results, indexRows, elapsed = future.result()
+        except Exception as generic_e:
+            self.log.exception("Error parsing pictures. Reason: %s", generic_e)
+            self._update(failed=pictures)
+            return
+        self.progress.add(parseSeconds=elapsed)
+        # The index writes and mkdirs would stall the result thread of the
+        # process pool, and so the dispatch of every other parsed chunk
+        self._track(self.copyPool.submit(self._dispatch, results, indexRows), pictures, self._dispatched)
+
+    def _dispatch(self, results, indexRows):
+        """
+        Indexes a parsed chunk, creates its folders and queues its copies.
+        """
+        if indexRows:
+            try:
+                self.index.upsertMany(indexRows)
+            except Exception as index_e:
+                # The index is only a cache of the metadata
+                self.log.error("Error indexing pictures. Reason: %s", index_e)
+        directoryErrors = self.directories.prepare(
+            set(result[1] for result in results if result[1] != None and result[3] == None))
+        for imagePath, relPath, size, error in results:
+            if error != None:
+                self.log.error("Error parsing picture. Reason: %s", error)
+                self._update(failed=1)
+            elif relPath == None:
+                self._update(skipped=1)
+            elif relPath in directoryErrors:
+                self.log.error("Error placing picture. Reason: %s", directoryErrors[relPath])
+                self._update(failed=1)
+            elif self.cancelEvent.is_set():
+                self._update(cancelled=1)
+            else:
+                self._track(self.copyPool.submit(self._place, imagePath, relPath, size),
+                            1, self._placed)
+
+    def _dispatched(self, future):
+        pictures = self._untrack(future)
+        if future.cancelled():
+            self._update(cancelled=pictures)
+        elif future.exception() != None:
+            self.log.error("Error placing pictures. Reason: %s", future.exception())
+            self._update(failed=pictures)
+
+    def _place(self, imagePath, relPath, size):
+        if self.cancelEvent.is_set():
+            return False
+        started = time.perf_counter()
+        try:
+            self.placePicture(imagePath, relPath)
+        finally:
+            self.progress.add(copySeconds=time.perf_counter()-started)
+        self.progress.add(bytesPlaced=size)
+        if self.journal != None:
+            self.journal.record(imagePath, relPath)
+        return True
+
+    def _placed(self, future):
+        self._untrack(future)
+        if future.cancelled() or (future.exception() == None and not future.result()):
+            self._update(cancelled=1)
+        elif future.exception() != None:
+            self.log.error("Error placing picture. Reason: %s", future.exception())
+            self._update(failed=1)
+        else:
+            self._update(placed=1)
+
+    def _update(self, **counters):
+        self.progress.add(**counters)
+        now = time.perf_counter()
+        with self.progress.lock:
+            finished = self.progress.done >= self.progress.total
+            if finished and self.journal != None:
+                if self.progress.cancelled == 0:
+                    self.journal.clear()
+                else:
+                    self.journal.sync()
+            if self.progressCallback == None:
+                return
+            if not finished and now-self.progress.lastReport < self.progressInterval:
+                return
+            self.progress.lastReport = now
+        self.progressCallback(self.progress.snapshot(self.parseWorkers, self.copyWorkers))
+
+    def shutdown(self, wait=True):
+        if hasattr(self, "_parsePool"):
+            self._parsePool.shutdown(wait=wait)
+        if hasattr(self, "_copyPool"):
+            self._copyPool.shutdown(wait=wait)
+        if hasattr(self, "_journal") and self._journal != None:
+            self._journal.sync()
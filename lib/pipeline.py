@@ -0,0 +1,148 @@
+"""
+Pipelined organizer engine: a source stage feeding worker stages through
+bounded queues.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+import CommonVariables
+
+# Marks the end of the stream in a stage queue, once per worker of the stage
+END = object()
+
+
+class StageStatistics:
+    """
+    Thread safe counters of a pipeline stage.
+    """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.processed, self.dropped, self.failed = 0, 0, 0
+        self.busySeconds = 0.0
+
+    def add(self, busySeconds, **counters):
+        with self.lock:
+            self.busySeconds += busySeconds
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name)+value)
+
+    def report(self, elapsed):
+        with self.lock:
+            elapsed = max(elapsed, 1e-6)
+            return (f"{self.name}: {self.processed} processed, {self.dropped} dropped, "
+                    f"{self.failed} failed, {self.processed/elapsed:.1f} items/s, "
+                    f"{self.busySeconds/(elapsed*self.workers):.0%} busy with {self.workers} workers")
+
+
+class Pipeline:
+    """
+    Runs source -> stage 1 -> stage 2 ... with every stage served by its own
+    threads and separated from the previous one by a bounded queue. A full
+    queue blocks the stage feeding it, so a slow stage throttles the ones
+    before it instead of letting work pile up in memory.
+
+    Stage functions take an item of the previous stage and return the item
+    for the next one, or None to drop it. Errors are logged and counted and
+    the item is dropped. Per-stage throughput is logged every reportInterval
+    seconds and when the run ends.
+    """
+
+    def __init__(self, source, stages, queueSize=None, reportInterval=None, name="Pipeline"):
+        """
+        Args:
+            - source (iterable): items of the first stage, consumed by the
+                                 "scan" stage thread.
+            - stages (list): (name, function, workers) tuples.
+            - queueSize (int): capacity of each queue between two stages, by
+                               default CommonVariables.pipelineQueueSize.
+            - reportInterval (float): seconds between two throughput log
+                                      lines, by default
+                                      CommonVariables.pipelineReportInterval.
+        """
+        self.source = source
+        self.stages = stages
+        self.queueSize = queueSize or CommonVariables.pipelineQueueSize
+        self.reportInterval = reportInterval or CommonVariables.pipelineReportInterval
+        self.statistics = [StageStatistics("scan", 1)] + [
+            StageStatistics(stageName, workers) for stageName, _, workers in stages]
+        self.log = logging.getLogger(name)
+
+    def run(self):
+        """
+        Runs the pipeline to completion and returns the stage statistics.
+        """
+        queues = [queue.Queue(maxsize=self.queueSize) for _ in self.stages]
+        remaining = [workers for _, _, workers in self.stages]
+        remainingLock = threading.Lock()
+        started = time.perf_counter()
+        done = threading.Event()
+
+        def scan():
+            statistics = self.statistics[0]
+            try:
+                for item in self.source:
+                    statistics.add(0, processed=1)
+                    queues[0].put(item)
+            except Exception as generic_e:
+                self.log.exception("Error scanning. Reason: %s", generic_e)
+                statistics.add(0, failed=1)
+            finally:
+                statistics.add(time.perf_counter()-started)
+                for _ in range(self.stages[0][2]):
+                    queues[0].put(END)
+
+        def work(stageIndex):
+            _, function, _ = self.stages[stageIndex]
+            statistics = self.statistics[stageIndex+1]
+            nextQueue = queues[stageIndex+1] if stageIndex+1 < len(queues) else None
+            while True:
+                item = queues[stageIndex].get()
+                if item is END:
+                    break
+                itemStarted = time.perf_counter()
+                try:
+                    result = function(item)
+                except Exception as generic_e:
+                    self.log.error("%s failed on %s. Reason: %s",
+                                   statistics.name, item, generic_e)
+                    statistics.add(time.perf_counter()-itemStarted, failed=1)
+                    continue
+                if result is None:
+                    statistics.add(time.perf_counter()-itemStarted, dropped=1)
+                    continue
+                statistics.add(time.perf_counter()-itemStarted, processed=1)
+                if nextQueue:
+                    nextQueue.put(result)
+            with remainingLock:
+                remaining[stageIndex] -= 1
+                last = remaining[stageIndex] == 0
+            if last and nextQueue:
+                for _ in range(self.stages[stageIndex+1][2]):
+                    nextQueue.put(END)
+
+        def report():
+            while not done.wait(self.reportInterval):
+                self.logStatistics(time.perf_counter()-started)
+
+        threads = [threading.Thread(target=scan, daemon=True)]
+        for stageIndex, (_, _, workers) in enumerate(self.stages):
+            threads += [threading.Thread(target=work, args=(stageIndex,), daemon=True)
+                        for _ in range(workers)]
+        reporter = threading.Thread(target=report, daemon=True)
+        for thread in threads+[reporter]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        done.set()
+        self.logStatistics(time.perf_counter()-started)
+        return self.statistics
+
+    def logStatistics(self, elapsed):
+        for statistics in self.statistics:
+            self.log.info(statistics.report(elapsed))
@@ -0,0 +1,207 @@
+"""
+File placement strategies: in-kernel copies, reflinks, hardlinks and moves.
+"""
+
+import errno
+import filecmp
+import os
+import shutil
+import sys
+import threading
+
+PLACEMENT_MODES = ("auto", "copy", "reflink", "hardlink", "move")
+
+# ioctl request cloning a whole file on Linux filesystems supporting it
+# (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+# (source st_dev, destination st_dev) pairs where reflinks already failed
+noReflink = set()
+
+
+class PlacementSummary:
+    """
+    Thread safe summary of the bytes copied, linked and moved by placeFile.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes = {"copied": 0, "linked": 0, "moved": 0}
+        self.files = {strategy: 0 for strategy in ("copy", "reflink", "hardlink", "move")}
+
+    def add(self, strategy, size, kind=None):
+        """
+        Counts a file placed with strategy; kind ("copied", "linked" or
+        "moved") overrides where its bytes are counted, e.g. "copied" for a
+        move across devices.
+        """
+        kind = kind or {"copy": "copied", "reflink": "linked", "hardlink": "linked", "move": "moved"}[strategy]
+        with self.lock:
+            self.bytes[kind] += size
+            self.files[strategy] += 1
+
+    def report(self):
+        with self.lock:
+            sizes = ", ".join(f"{size/2**20:.1f} MB {kind}" for kind, size in self.bytes.items())
+            files = ", ".join(f"{count} {strategy}" for strategy, count in self.files.items() if count)
+            return f"{sizes} ({files or 'no files'})"
+
+
+def createExclusive(destination):
+    """
+    Opens destination for writing, raising FileExistsError when it exists.
+    """
+    return os.fdopen(os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0),
+                             0o666), "wb")
+
+
+def kernelCopy(source, destination):
+    """
+    Copies source to destination without going through user space buffers:
+    os.copy_file_range, then os.sendfile, then a plain buffered copy where
+    neither is supported. Metadata is copied as shutil.copy2 does.
+
+    An existing destination is never replaced (FileExistsError); a copy
+    failing midway removes its partial destination.
+    """
+    with open(source, "rb") as sourceFile:
+        destinationFile = createExclusive(destination)
+        try:
+            with destinationFile:
+                copyData(sourceFile, destinationFile)
+        except BaseException:
+            os.remove(destination)
+            raise
+    shutil.copystat(source, destination)
+
+
+def copyData(sourceFile, destinationFile):
+    """
+    Copies the data of the open sourceFile into the open destinationFile.
+    """
+    size = os.fstat(sourceFile.fileno()).st_size
+    copied = 0
+    for copyFunction in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if copyFunction is None:
+            continue
+        try:
+            while copied < size:
+                if copyFunction is os.sendfile:
+                    sent = os.sendfile(destinationFile.fileno(), sourceFile.fileno(), copied, size-copied)
+                else:
+                    sent = os.copy_file_range(sourceFile.fileno(), destinationFile.fileno(),
+                                              size-copied, copied, copied)
+                if sent == 0:
+                    break
+                copied += sent
+            break
+        except OSError as copy_e:
+            if copied > 0 or not copy_e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                                  errno.EOPNOTSUPP, errno.ENOTSOCK, errno.EBADF):
+                raise
+    if copied < size:
+        sourceFile.seek(copied)
+        destinationFile.seek(copied)
+        shutil.copyfileobj(sourceFile, destinationFile, 1024*1024)
+
+
+def reflink(source, destination):
+    """
+    Clones source into destination sharing its data blocks (copy on write).
+    Returns False when the platform or filesystem does not support it. An
+    existing destination is never replaced (FileExistsError).
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    with open(source, "rb") as sourceFile, createExclusive(destination) as destinationFile:
+        try:
+            fcntl.ioctl(destinationFile.fileno(), FICLONE, sourceFile.fileno())
+        except OSError:
+            cloned = False
+        else:
+            cloned = True
+    if not cloned:
+        # The empty file created above
+        os.remove(destination)
+        return False
+    shutil.copystat(source, destination)
+    return True
+
+
+def placeFile(source, destination, mode="auto", summary=None):
+    """
+    Places source at destination, whose folder must exist, and returns the
+    strategy used: "copy", "reflink", "hardlink" or "move". An existing
+    destination is never replaced, in any mode: FileExistsError is raised.
+
+    Args:
+        - mode (string): one of PLACEMENT_MODES. Links and moves need source
+                         and destination on the same device; otherwise every
+                         mode falls back to an in-kernel copy ("move" then
+                         deletes the source).
+                         - "auto": reflink when the filesystem supports it, copy otherwise.
+                         - "copy": always copy.
+                         - "reflink": same as auto.
+                         - "hardlink": hardlink, the destination shares the source inode.
+                         - "move": link the source at destination, then
+                                   unlink it (a rename would replace an
+                                   existing destination).
+        - summary (PlacementSummary): accumulates the bytes placed per strategy.
+    """
+    if not mode in PLACEMENT_MODES:
+        raise ValueError(f"Unknown placement mode {mode}")
+    sourceStat = os.stat(source)
+    devices = (sourceStat.st_dev, os.stat(os.path.dirname(os.path.abspath(destination))).st_dev)
+    sameDevice = devices[0] == devices[1]
+    strategy = "copy"
+    if sameDevice and mode == "move":
+        try:
+            os.link(source, destination)
+        except FileExistsError:
+            raise
+        except OSError:
+            # Filesystems without hardlinks (FAT, some shares) copy instead
+            pass
+        else:
+            os.unlink(source)
+            strategy = "move"
+    elif sameDevice and mode == "hardlink":
+        os.link(source, destination)
+        strategy = "hardlink"
+    elif sameDevice and mode in ("auto", "reflink") and not devices in noReflink:
+        if reflink(source, destination):
+            strategy = "reflink"
+        else:
+            noReflink.add(devices)
+    kind = None
+    if strategy == "copy":
+        kernelCopy(source, destination)
+        if mode == "move":
+            os.remove(source)
+            strategy, kind = "move", "copied"
+    if summary:
+        summary.add(strategy, sourceStat.st_size, kind)
+    return strategy
+
+
+def placeUnique(source, directory, mode="auto", summary=None):
+    """
+    Places source in directory under its own name, or the first free
+    name_N one when the name is taken by another file, and returns the
+    (destination, strategy) pair. When an identical file already holds the
+    name nothing is placed and strategy is None.
+
+    Names are claimed atomically by placeFile, so concurrent placements in
+    the same directory never replace each other.
+    """
+    name, extension = os.path.splitext(os.path.basename(source))
+    suffix = 0
+    while True:
+        destination = os.path.join(directory, f"{name}{f'_{suffix}' if suffix else ''}{extension}")
+        try:
+            return (destination, placeFile(source, destination, mode, summary))
+        except FileExistsError:
+            if filecmp.cmp(source, destination, shallow=False):
+                return (destination, None)
+            suffix += 1
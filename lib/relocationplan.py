@@ -0,0 +1,222 @@
+"""
+Two-phase relocation: a JSON-lines plan written by a dry run, then executed
+by an I/O scheduler grouping operations by source and destination device.
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import CommonVariables
+from lib import directories
+
+PLAN_BATCH = 256
+
+# action is "copy" for pictures to place and "skip" for duplicates or
+# pictures already relocated, which are kept in the plan for reference.
+# hash is the content hash when one was computed, None otherwise.
+PlanEntry = namedtuple("PlanEntry", ["source", "destination", "size", "hash", "action"])
+
+
+class RelocationPlan:
+    """
+    Append-only JSON-lines file of PlanEntry rows, one object per line.
+
+    Rows are written in batches of PLAN_BATCH lines; call flush() once the
+    dry run is over.
+    """
+
+    def __init__(self, planPath=None, batchSize=PLAN_BATCH):
+        self.planPath = planPath or CommonVariables.relocationPlanPath
+        self.batchSize = batchSize
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def add(self, entry):
+        with self.lock:
+            self.pending.append(json.dumps(entry._asdict()))
+            full = len(self.pending) >= self.batchSize
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if len(self.pending) == 0:
+                return
+            if os.path.dirname(self.planPath) != "":
+                os.makedirs(os.path.dirname(self.planPath), exist_ok=True)
+            with open(self.planPath, "a") as plan:
+                plan.write("\n".join(self.pending)+"\n")
+            self.pending = []
+
+    def clear(self):
+        with self.lock:
+            self.pending = []
+            if os.path.exists(self.planPath):
+                os.remove(self.planPath)
+
+    def entries(self):
+        """
+        Yields the PlanEntry rows of the plan file, ignoring a truncated last
+        line left by a crash.
+        """
+        if not os.path.exists(self.planPath):
+            return
+        with open(self.planPath, "r") as plan:
+            for line in plan:
+                try:
+                    yield PlanEntry(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue
+
+    def estimate(self, bytesPerSecond=None):
+        """
+        Returns a dict with the files and bytes to copy and skip, and the
+        estimated seconds at bytesPerSecond (by default
+        CommonVariables.planBytesPerSecond).
+        """
+        bytesPerSecond = bytesPerSecond or CommonVariables.planBytesPerSecond
+        estimate = {"files": 0, "bytes": 0, "skipped": 0, "skippedBytes": 0}
+        for entry in self.entries():
+            if entry.action == "copy":
+                estimate["files"] += 1
+                estimate["bytes"] += entry.size
+            else:
+                estimate["skipped"] += 1
+                estimate["skippedBytes"] += entry.size
+        estimate["seconds"] = estimate["bytes"]/bytesPerSecond
+        return estimate
+
+
+def deviceOf(path, devices):
+    """
+    Returns the st_dev of path or of its closest parent that can be
+    stat'ed, caching folders in the devices dict.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    missing = []
+    while not directory in devices:
+        try:
+            devices[directory] = os.stat(directory).st_dev
+        except OSError:
+            # Missing, unreadable (EACCES) or offline (EIO) folders alike:
+            # grouping by device must not fail the whole plan
+            missing.append(directory)
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                devices[directory] = None
+            directory = parent
+    for folder in missing:
+        devices[folder] = devices[directory]
+    return devices[directory]
+
+
+class PlanExecutor:
+    """
+    Runs the "copy" entries of a RelocationPlan.
+
+    Entries are grouped by (source device, destination device); every group
+    gets its own pool of deviceWorkers threads and is processed in source
+    path order, so a slow disk never starves the others and each disk sees
+    a bounded number of concurrent streams. Entries listed in the journal,
+    or whose destination already exists with the planned size, are skipped,
+    which resumes an interrupted run without parsing anything again.
+    """
+
+    def __init__(self, place, deviceWorkers=None, reportInterval=None, journal=None):
+        """
+        Args:
+            - place (callable): called as place(source, destination); the
+                                destination folder already exists.
+            - deviceWorkers (int): threads per device pair, by default
+                                   CommonVariables.scanDeviceLimit.
+            - reportInterval (float): seconds between two progress log lines,
+                                      by default CommonVariables.pipelineReportInterval.
+            - journal (RelocationJournal): records the entries placed.
+        """
+        self.place = place
+        self.journal = journal
+        self.deviceWorkers = deviceWorkers or CommonVariables.scanDeviceLimit
+        self.reportInterval = reportInterval or CommonVariables.pipelineReportInterval
+        self.directories = directories.DirectoryPlanner()
+        self.lock = threading.Lock()
+        self.counters = {"placed": 0, "failed": 0, "resumed": 0, "bytes": 0}
+        self.log = logging.getLogger("PlanExecutor")
+
+    def done(self, entry):
+        # A source journaled for another destination belongs to an older plan
+        if self.journal != None and self.journal.isDone(entry.source, entry.destination):
+            return True
+        try:
+            return os.path.getsize(entry.destination) == entry.size
+        except OSError:
+            return False
+
+    def execute(self, plan):
+        """
+        Executes plan (a RelocationPlan or an iterable of PlanEntry) and
+        returns the counters dict: placed, failed, resumed, bytes and elapsed.
+        """
+        started = time.perf_counter()
+        entries = plan.entries() if isinstance(plan, RelocationPlan) else plan
+        groups = {}
+        devices = {}
+        for entry in entries:
+            if entry.action != "copy":
+                continue
+            if self.done(entry):
+                self.counters["resumed"] += 1
+                continue
+            key = (deviceOf(entry.source, devices), deviceOf(entry.destination, devices))
+            groups.setdefault(key, []).append(entry)
+        total = sum(len(group) for group in groups.values())
+        self.log.info("Executing %d operations over %d device pairs", total, len(groups))
+        directoryErrors = self.directories.prepare(
+            set(os.path.dirname(entry.destination) for group in groups.values() for entry in group))
+        pools = []
+        futures = []
+        for group in groups.values():
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.deviceWorkers)
+            pools.append(pool)
+            for entry in sorted(group):
+                futures.append(pool.submit(self._execute, entry,
+                                           directoryErrors.get(os.path.dirname(entry.destination))))
+        lastReport = time.perf_counter()
+        for future in concurrent.futures.as_completed(futures):
+            if time.perf_counter()-lastReport >= self.reportInterval:
+                lastReport = time.perf_counter()
+                self._report(total, lastReport-started)
+        for pool in pools:
+            pool.shutdown()
+        if self.journal != None:
+            self.journal.sync()
+        self.counters["elapsed"] = time.perf_counter()-started
+        self._report(total, self.counters["elapsed"])
+        return dict(self.counters)
+
+    def _execute(self, entry, directoryError):
+        try:
+            if directoryError != None:
+                raise directoryError
+            self.place(entry.source, entry.destination)
+        except Exception as generic_e:
+            self.log.error("Error placing %s. Reason: %s", entry.source, generic_e)
+            with self.lock:
+                self.counters["failed"] += 1
+            return
+        if self.journal != None:
+            self.journal.record(entry.source, entry.destination)
+        with self.lock:
+            self.counters["placed"] += 1
+            self.counters["bytes"] += entry.size
+
+    def _report(self, total, elapsed):
+        with self.lock:
+            counters = dict(self.counters)
+        self.log.info("%d/%d placed, %d failed, %d already done, %.1f MB/s",
+                      counters["placed"], total, counters["failed"], counters["resumed"],
+                      counters["bytes"]/2**20/elapsed if elapsed > 0 else 0.0)
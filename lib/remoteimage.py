@@ -0,0 +1,41 @@
+"""
+NEFImage over rclone remotes, read through ranged fetches and a block cache.
+"""
+
+import CommonVariables
+from dev import tiffreader
+
+
+class RemoteNEFImage(tiffreader.NEFImage):
+    """
+    NEFImage of a "remote:path" object, e.g. on Google Drive.
+
+    Reads go through a tiffreader.BlockCacheReader whose blocks are fetched
+    with ranged `rclone cat` reads (a single HTTP request each with an rcd
+    session), so parsing the metadata of a RAW file transfers its header
+    blocks only. Local sidecars do not apply to remote pictures.
+    """
+
+    def __init__(self, remotePath, rcloneHandler, blockSize=None, cacheBlocks=None):
+        """
+        Args:
+            - remotePath (string): A string "remote:path" of the picture.
+            - rcloneHandler (RCloneWrapper): serves the ranged reads.
+            - blockSize (int): bytes per cached block, by default
+                               CommonVariables.remoteBlockSize.
+            - cacheBlocks (int): blocks kept in memory, by default
+                                 CommonVariables.remoteCacheBlocks.
+        """
+        self.rcloneHandler = rcloneHandler
+        blockSize = blockSize or CommonVariables.remoteBlockSize
+        reader = tiffreader.BlockCacheReader(self.fetch, blockSize,
+                                             cacheBlocks or CommonVariables.remoteCacheBlocks,
+                                             max(blockSize, tiffreader.HEADER_SIZE))
+        super().__init__(remotePath, reader=reader)
+
+    def findJSON(self):
+        pass
+
+    def fetch(self, offset, length):
+        with self.rcloneHandler.catStream(self.imagePath, offset, length) as stream:
+            return stream.read()
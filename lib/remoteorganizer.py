@@ -0,0 +1,248 @@
+"""
+Organizer of rclone remotes: metadata through ranged reads and server-side
+moves, so no picture goes through the local machine.
+"""
+
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+import CommonVariables
+from lib import remoteimage
+from lib.organizer import ORGANIZE_PARAMETERS
+
+
+def joinRemote(directory, name):
+    if directory == "" or directory[-1] in [":", "/"]:
+        return directory+name
+    return directory+"/"+name
+
+
+def splitRemotePath(remotePath):
+    """
+    Splits "remote:dir/file" into ("remote:dir", "file").
+    """
+    directory, separator, name = remotePath.rpartition("/")
+    if separator == "":
+        remote, colon, name = remotePath.rpartition(":")
+        return (remote+colon, name)
+    return (directory, name)
+
+
+class RemoteOrganizer:
+    """
+    Organizes the pictures of a "remote:path" folder into outputRoot, on
+    the same or another remote.
+
+    The folder is listed once with a streamed `lsjson --recursive`, whose
+    entries are handed to the workers as they are parsed; the metadata of
+    every picture is parsed with a RemoteNEFImage in a pool of fetchWorkers
+    threads, at most two tasks per thread in flight, and the pictures are
+    then moved (or copied) server-side in batches of batchSize files:
+    one `operations/movefile` rc call per picture over moveWorkers threads
+    with an rcd session, otherwise one `rclone move --files-from` process
+    per batch of pictures sharing their source and destination folders.
+
+    Destinations are unique: the files already in outputRoot are listed
+    before planning, and a picture whose name is taken there, or by another
+    picture of the run, gets a free name_N name instead. No move ever
+    replaces a file.
+    """
+
+    def __init__(self, rcloneHandler, outputRoot, parameters=ORGANIZE_PARAMETERS,
+                 move=True, fetchWorkers=None, moveWorkers=None, batchSize=None):
+        """
+        Args:
+            - rcloneHandler (RCloneWrapper): runs the listing, reads and moves.
+            - outputRoot (string): A string "remote:path" of the organized tree.
+            - parameters (list): relocation parameters, as per NEFImage.relocatePath.
+            - move (bool): move the pictures, copy them otherwise.
+            - fetchWorkers (int): metadata threads, by default
+                                  CommonVariables.remoteFetchWorkers.
+            - moveWorkers (int): concurrent moves, by default
+                                 CommonVariables.remoteMoveWorkers.
+            - batchSize (int): pictures per batch, by default
+                               CommonVariables.remoteBatchSize.
+        """
+        self.rcloneHandler = rcloneHandler
+        self.outputRoot = outputRoot
+        self.parameters = parameters
+        self.move = move
+        self.fetchWorkers = fetchWorkers or CommonVariables.remoteFetchWorkers
+        self.moveWorkers = moveWorkers or CommonVariables.remoteMoveWorkers
+        self.batchSize = batchSize or CommonVariables.remoteBatchSize
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.taken = set()
+        self.log = logging.getLogger("RemoteOrganizer")
+
+    def list(self, root):
+        """
+        Yields the "remote:path" of every file below root as it is listed.
+        """
+        for entry in self.rcloneHandler.lsjsonStream(root, ["--recursive", "--files-only"]):
+            if not entry.isDir:
+                self.counters["listed"] += 1
+                yield joinRemote(root, entry.path)
+
+    def takenPaths(self):
+        """
+        Returns the set of "remote:path" of the files already in outputRoot.
+        """
+        try:
+            return set(joinRemote(self.outputRoot, entry.path) for entry in
+                       self.rcloneHandler.lsjsonStream(self.outputRoot, ["--recursive", "--files-only"]))
+        except Exception as list_e:
+            # Nothing is taken in an output folder that does not exist yet
+            if "not found" in str(list_e).lower():
+                return set()
+            raise
+
+    def reserve(self, destination):
+        """
+        Returns destination, or a free name_N variant of it when the name is
+        taken, and marks the returned path as taken.
+        """
+        directory, name = splitRemotePath(destination)
+        stem, extension = os.path.splitext(name)
+        suffix = 0
+        while destination in self.taken:
+            suffix += 1
+            destination = joinRemote(directory, f"{stem}_{suffix}{extension}")
+        if suffix:
+            self.counters["renamed"] += 1
+        self.taken.add(destination)
+        return destination
+
+    def destination(self, remotePath):
+        """
+        Returns the "remote:path" where remotePath belongs, None for files
+        that are not TIFF pictures.
+        """
+        NEF = remoteimage.RemoteNEFImage(remotePath, self.rcloneHandler)
+        try:
+            # Joined as the listed paths are, so a bare "remote:" root matches
+            relPath = NEF.relocatePath("", self.parameters)
+        finally:
+            with self.lock:
+                self.counters["bytesRead"] += NEF.bytesRead
+            NEF.close()
+        return joinRemote(self.outputRoot, relPath+splitRemotePath(remotePath)[1])
+
+    def _destination(self, remotePath):
+        try:
+            return self.destination(remotePath)
+        except ValueError:
+            with self.lock:
+                self.counters["skipped"] += 1
+        except Exception as read_e:
+            self.log.error("Error reading %s. Reason: %s", remotePath, read_e)
+            with self.lock:
+                self.counters["failed"] += 1
+        return None
+
+    def plan(self, remotePaths):
+        """
+        Returns the (source, destination) pairs of the pictures in
+        remotePaths that are not organized yet, destinations being reserved
+        (see reserve). remotePaths may be a generator, consumed as the
+        workers become free.
+        """
+        moves = []
+        pending = {}
+        paths = iter(remotePaths)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.fetchWorkers) as pool:
+            while True:
+                for remotePath in paths:
+                    pending[pool.submit(self._destination, remotePath)] = remotePath
+                    if len(pending) >= 2*self.fetchWorkers:
+                        break
+                if len(pending) == 0:
+                    break
+                finished, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    source, destination = pending.pop(future), future.result()
+                    if destination == None:
+                        continue
+                    if destination == source:
+                        self.counters["organized"] += 1
+                    else:
+                        moves.append((source, self.reserve(destination)))
+        return moves
+
+    def batches(self, moves):
+        """
+        Splits moves into batches of at most batchSize pairs sharing their
+        source and destination folders and file names, as `--files-from`
+        transfers keep names.
+        """
+        groups = {}
+        for source, destination in moves:
+            sourceDir, sourceName = splitRemotePath(source)
+            destinationDir, destinationName = splitRemotePath(destination)
+            if sourceName != destinationName:
+                key = (source, destination)
+            else:
+                key = (sourceDir, destinationDir)
+            groups.setdefault(key, []).append((source, destination))
+        return [group[start:start+self.batchSize] for group in groups.values()
+                for start in range(0, len(group), self.batchSize)]
+
+    def transfer(self, batch):
+        try:
+            if len(batch) > 1 and self.rcloneHandler.session == None:
+                self.rcloneHandler.transferFiles(
+                    splitRemotePath(batch[0][0])[0], splitRemotePath(batch[0][1])[0],
+                    [splitRemotePath(source)[1] for source, _ in batch], self.move,
+                    ["--ignore-existing"])
+            else:
+                for source, destination in batch:
+                    if self.move:
+                        self.rcloneHandler.moveto(source, destination)
+                    else:
+                        self.rcloneHandler.copyto(source, destination)
+        except Exception as generic_e:
+            self.log.error("Error moving %s. Reason: %s", batch[0][0], generic_e)
+            with self.lock:
+                self.counters["failed"] += len(batch)
+            return
+        with self.lock:
+            self.counters["moved"] += len(batch)
+
+    def execute(self, moves):
+        """
+        Moves (or copies) the (source, destination) pairs server-side.
+        """
+        if self.rcloneHandler.session != None:
+            # One rc call per picture, spread over the threads
+            batches = [[move] for move in moves]
+            reportEvery = self.batchSize
+        else:
+            batches = self.batches(moves)
+            reportEvery = 1
+        self.log.info("Moving %d pictures in %d batches", len(moves), len(batches))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.moveWorkers) as pool:
+            for done, _ in enumerate(pool.map(self.transfer, batches), 1):
+                if done % reportEvery == 0:
+                    self.log.info("%d/%d moved, %d failed", self.counters["moved"],
+                                  len(moves), self.counters["failed"])
+
+    def organize(self, root):
+        """
+        Organizes every picture below root and returns the counters dict:
+        listed, skipped, failed, organized (already in place), moved,
+        renamed (moved to a name_N name), bytesRead and elapsed.
+        """
+        started = time.perf_counter()
+        self.counters = {"listed": 0, "skipped": 0, "failed": 0, "organized": 0,
+                         "moved": 0, "renamed": 0, "bytesRead": 0}
+        self.taken = self.takenPaths()
+        moves = self.plan(self.list(root))
+        self.log.info("%d files listed, %d pictures to move, %d KB of metadata read",
+                      self.counters["listed"], len(moves), self.counters["bytesRead"]//1024)
+        self.execute(moves)
+        self.counters["elapsed"] = time.perf_counter()-started
+        return dict(self.counters)
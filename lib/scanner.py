@@ -0,0 +1,248 @@
+"""
+Streaming directory scanner built on os.scandir.
+"""
+
+import os
+import queue
+import threading
+from collections import deque, namedtuple
+
+import CommonVariables
+
+IMAGE_EXTENSIONS = frozenset(["jpg", "nef", "png", "tiff", "dng", "jpeg", "raw", "mp4", "mov", "heic"])
+
+
+class ScanEntry(namedtuple("ScanEntry", ["path", "size", "mtime", "ext"])):
+    """
+    A scanned file: path, size in bytes, modification time in nanoseconds and
+    lower case extension. Also usable where an os.stat_result is expected for
+    st_size and st_mtime_ns, e.g. by MetadataIndex.lookup.
+    """
+    __slots__ = ()
+
+    @property
+    def st_size(self):
+        return self.size
+
+    @property
+    def st_mtime_ns(self):
+        return self.mtime
+
+
+def extensionOf(name):
+    """
+    Returns the lower case extension of a file name, "" when it has none.
+    """
+    dot = name.rfind(".")
+    if dot == -1:
+        return ""
+    return name[dot+1:].lower()
+
+
+def scanFiles(roots, extensions=IMAGE_EXTENSIONS, followSymlinks=True, onError=None):
+    """
+    Lazily yields a ScanEntry per file found under roots.
+
+    Files of a directory are yielded while it is being listed, so consumers
+    can start before the walk finishes. Sizes and times come from the
+    DirEntry stat data. Directories are identified by (st_dev, st_ino), so a
+    directory reached twice through symlinks or overlapping roots is only
+    listed once.
+
+    Args:
+        - roots (string or list): directories to scan.
+        - extensions (frozenset): lower case extensions to yield, None for all files.
+        - followSymlinks (bool): whether symlinked files and directories are followed.
+        - onError (callable): called with the OSError of an unreadable entry,
+                              which is skipped.
+    """
+    if isinstance(roots, (str, os.PathLike)):
+        roots = [roots]
+    visited = set()
+    for root in roots:
+        stack = [os.fspath(root)]
+        while stack:
+            listing = listDirectory(stack.pop(), visited, extensions, followSymlinks, onError)
+            if listing == None:
+                continue
+            files, subdirectories, _ = listing
+            yield from files
+            stack.extend(reversed(subdirectories))
+
+
+def listDirectory(directory, visited, extensions, followSymlinks, onError, visitedLock=None):
+    """
+    Lists a directory for scanFiles and scanFilesParallel.
+
+    Returns a (files, subdirectories, st_dev) tuple, or None when the
+    directory was already listed or cannot be read.
+    """
+    try:
+        directoryStat = os.stat(directory, follow_symlinks=followSymlinks)
+        key = (directoryStat.st_dev, directoryStat.st_ino)
+        if visitedLock:
+            with visitedLock:
+                if key in visited:
+                    return None
+                visited.add(key)
+        else:
+            if key in visited:
+                return None
+            visited.add(key)
+        files, subdirectories = [], []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=followSymlinks):
+                        subdirectories.append(entry.path)
+                        continue
+                    ext = extensionOf(entry.name)
+                    if extensions is None or ext in extensions:
+                        stat = entry.stat(follow_symlinks=followSymlinks)
+                        files.append(ScanEntry(entry.path, stat.st_size, stat.st_mtime_ns, ext))
+                except OSError as entry_e:
+                    if onError:
+                        onError(entry_e)
+        return (files, subdirectories, directoryStat.st_dev)
+    except OSError as directory_e:
+        if onError:
+            onError(directory_e)
+        return None
+
+
+class ParallelWalker:
+    """
+    Explores several roots at once with a pool of threads.
+
+    Each thread owns a deque of directories to list: it works depth first on
+    its own deque and steals the oldest (shallowest) directories of the
+    others when it runs dry. Directories are listed under a semaphore of
+    their device, so a single disk or share never gets more than
+    deviceLimit concurrent listings while the other ones keep busy.
+    """
+
+    def __init__(self, roots, extensions=IMAGE_EXTENSIONS, followSymlinks=True, onError=None,
+                 workers=None, deviceLimit=None, bufferSize=1024):
+        if isinstance(roots, (str, os.PathLike)):
+            roots = [roots]
+        self.extensions = extensions
+        self.followSymlinks = followSymlinks
+        self.onError = onError
+        self.workers = workers or CommonVariables.scanWorkers
+        self.deviceLimit = deviceLimit or CommonVariables.scanDeviceLimit
+        self.deques = [deque() for _ in range(self.workers)]
+        self.semaphores = {}
+        self.visited = set()
+        self.lock = threading.Lock()
+        # Idle workers wait on changed until a directory is done, that is until
+        # new subdirectories or a device slot may be available
+        self.changed = threading.Condition(self.lock)
+        self.generation = 0
+        self.results = queue.Queue(maxsize=bufferSize)
+        self.stopped = threading.Event()
+        self.pending = 0
+        for index, root in enumerate(roots):
+            root = os.fspath(root)
+            try:
+                device = os.stat(root).st_dev
+            except OSError:
+                device = root
+            self.deques[index % self.workers].append((root, device))
+            self.pending += 1
+
+    def semaphore(self, device):
+        with self.lock:
+            if not device in self.semaphores:
+                self.semaphores[device] = threading.BoundedSemaphore(self.deviceLimit)
+            return self.semaphores[device]
+
+    def take(self, workerIndex):
+        """
+        Returns a directory acquired under its device semaphore, None if there
+        is nothing left to take for now.
+        """
+        own = self.deques[workerIndex]
+        candidates = [own.pop] + [self.deques[(workerIndex+offset) % self.workers].popleft
+                                  for offset in range(1, self.workers)]
+        for candidate in candidates:
+            try:
+                directory, device = candidate()
+            except IndexError:
+                continue
+            if self.semaphore(device).acquire(blocking=False):
+                return (directory, device)
+            own.appendleft((directory, device))
+        return None
+
+    def work(self, workerIndex):
+        while not self.stopped.is_set():
+            with self.lock:
+                generation = self.generation
+            item = self.take(workerIndex)
+            if item == None:
+                with self.changed:
+                    self.changed.wait_for(lambda: self.generation != generation or self.pending == 0
+                                          or self.stopped.is_set())
+                    if self.pending == 0:
+                        break
+                continue
+            directory, device = item
+            try:
+                listing = listDirectory(directory, self.visited, self.extensions,
+                                        self.followSymlinks, self.onError, self.lock)
+            finally:
+                self.semaphore(device).release()
+            if listing != None:
+                files, subdirectories, directoryDevice = listing
+                with self.lock:
+                    self.pending += len(subdirectories)
+                self.deques[workerIndex].extend((subdirectory, directoryDevice)
+                                                for subdirectory in subdirectories)
+                if files:
+                    self.put(files)
+            with self.changed:
+                self.pending -= 1
+                self.generation += 1
+                self.changed.notify_all()
+        self.put(None)
+
+    def put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def __iter__(self):
+        threads = [threading.Thread(target=self.work, args=(index,), daemon=True)
+                   for index in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        running = len(threads)
+        try:
+            while running:
+                files = self.results.get()
+                if files == None:
+                    running -= 1
+                else:
+                    yield from files
+        finally:
+            self.stopped.set()
+            with self.changed:
+                self.changed.notify_all()
+
+
+def scanFilesParallel(roots, extensions=IMAGE_EXTENSIONS, followSymlinks=True, onError=None,
+                      workers=None, deviceLimit=None):
+    """
+    Same stream as scanFiles, explored by a ParallelWalker: the roots, and
+    the directories under them, are listed concurrently and merged into a
+    single stream. The files of a directory are still yielded together.
+
+    Args:
+        - workers (int): walking threads, by default CommonVariables.scanWorkers.
+        - deviceLimit (int): concurrent listings per device, by default
+                             CommonVariables.scanDeviceLimit.
+    """
+    return iter(ParallelWalker(roots, extensions, followSymlinks, onError, workers, deviceLimit))
@@ -0,0 +1,165 @@
+"""
+Thumbnail service: in-memory LRU of QImages over an on-disk JPEG cache, fed
+by a background pool from the previews embedded in the pictures.
+"""
+
+import concurrent.futures
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from PyQt5.QtCore import QBuffer, QByteArray, QObject, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QTransform
+
+import CommonVariables
+from dev import tiffreader
+
+TIFF_EXTENSIONS = frozenset(["nef", "tif", "tiff", "dng"])
+
+# Rotation applied to a TIFF preview per the IFD0 Orientation tag
+ORIENTATION_ROTATIONS = {3: 180, 6: 90, 8: 270}
+
+
+def readThumbnail(imagePath, size):
+    """
+    Decodes a QImage of imagePath whose longest side is at most size.
+
+    TIFF based pictures are read through their smallest embedded JPEG
+    preview covering size, the RAW data is never decoded. JPEG decoding is
+    scaled down by the reader itself. Returns a null QImage on failure.
+    """
+    extension = os.path.splitext(imagePath)[1][1:].lower()
+    rotation = 0
+    if extension in TIFF_EXTENSIONS:
+        image = tiffreader.NEFImage(imagePath, "mmap")
+        try:
+            preview = image.preview(size)
+            if preview == None:
+                return QImage()
+            data = QByteArray(bytes(preview))
+            del preview
+            rotation = ORIENTATION_ROTATIONS.get(getattr(image.tagsFirstIFD, "Orientation", 1), 0)
+        finally:
+            image.close()
+        device = QBuffer(data)
+        device.open(QBuffer.ReadOnly)
+        reader = QImageReader(device, b"jpg")
+    else:
+        reader = QImageReader(imagePath)
+        reader.setAutoTransform(True)
+    original = reader.size()
+    if original.isValid() and max(original.width(), original.height()) > size:
+        reader.setScaledSize(original.scaled(QSize(size, size), Qt.KeepAspectRatio))
+    thumbnail = reader.read()
+    if thumbnail.isNull():
+        logging.getLogger("Thumbnails").debug("%s: %s", imagePath, reader.errorString())
+        return thumbnail
+    if max(thumbnail.width(), thumbnail.height()) > size:
+        thumbnail = thumbnail.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    if rotation:
+        thumbnail = thumbnail.transformed(QTransform().rotate(rotation))
+    return thumbnail
+
+
+class ThumbnailCache(QObject):
+    """
+    Asynchronous thumbnails for the view.
+
+    request() answers from memory or returns None at once and schedules the
+    thumbnail in a background pool, which tries the disk cache first and
+    generates it (see readThumbnail) on a miss. Finished thumbnails are
+    emitted through thumbnailReady as they come, so the GUI thread never
+    waits on disk. The memory tier is an LRU bounded in bytes; disk entries
+    are keyed by (path, size, mtime, target size), so a modified picture
+    gets a new thumbnail.
+    """
+
+    thumbnailReady = pyqtSignal(str, QImage)
+
+    def __init__(self, size=None, memoryBytes=None, cachePath=None, workers=None):
+        super().__init__()
+        self.size = size or CommonVariables.thumbnailSize
+        self.memoryBytes = memoryBytes or CommonVariables.thumbnailMemoryBytes
+        self.cachePath = CommonVariables.thumbnailCachePath if cachePath is None else cachePath
+        self.workers = workers or CommonVariables.thumbnailWorkers
+        self.memory = OrderedDict()
+        self.memoryUsed = 0
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.log = logging.getLogger("Thumbnails")
+
+    @property
+    def pool(self):
+        if not hasattr(self, "_pool"):
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def request(self, imagePath):
+        """
+        Returns the thumbnail of imagePath if it is in memory, None otherwise
+        after scheduling it: thumbnailReady is emitted once it is available.
+        """
+        with self.lock:
+            if imagePath in self.memory:
+                self.memory.move_to_end(imagePath)
+                return self.memory[imagePath]
+            if not imagePath in self.pending:
+                self.pending[imagePath] = self.pool.submit(self._load, imagePath)
+        return None
+
+    def cancelPending(self):
+        """
+        Drops the requests not started yet, e.g. those scrolled out of view.
+        """
+        with self.lock:
+            for imagePath, future in list(self.pending.items()):
+                if future.cancel():
+                    del self.pending[imagePath]
+
+    def diskPath(self, imagePath, stat):
+        key = hashlib.blake2b(
+            f"{os.path.abspath(imagePath)}|{stat.st_size}|{stat.st_mtime_ns}|{self.size}".encode(),
+            digest_size=16).hexdigest()
+        return os.path.join(self.cachePath, key[0:2], key+".jpg")
+
+    def _load(self, imagePath):
+        try:
+            thumbnail = QImage()
+            diskPath = None
+            if self.cachePath != "":
+                diskPath = self.diskPath(imagePath, os.stat(imagePath))
+                if os.path.exists(diskPath):
+                    thumbnail = QImage(diskPath)
+            if thumbnail.isNull():
+                thumbnail = readThumbnail(imagePath, self.size)
+                if diskPath != None and not thumbnail.isNull():
+                    self._store(diskPath, thumbnail)
+        except Exception as generic_e:
+            self.log.error("Error creating thumbnail of %s. Reason: %s", imagePath, generic_e)
+            thumbnail = QImage()
+        with self.lock:
+            self.pending.pop(imagePath, None)
+            if not thumbnail.isNull():
+                self._remember(imagePath, thumbnail)
+        self.thumbnailReady.emit(imagePath, thumbnail)
+
+    def _store(self, diskPath, thumbnail):
+        os.makedirs(os.path.dirname(diskPath), exist_ok=True)
+        temporaryPath = f"{diskPath}.{threading.get_ident()}.tmp"
+        if thumbnail.save(temporaryPath, "JPG", 85):
+            os.replace(temporaryPath, diskPath)
+
+    def _remember(self, imagePath, thumbnail):
+        # Called with self.lock held
+        self.memory[imagePath] = thumbnail
+        self.memoryUsed += thumbnail.sizeInBytes()
+        while self.memoryUsed > self.memoryBytes and len(self.memory) > 1:
+            _, evicted = self.memory.popitem(last=False)
+            self.memoryUsed -= evicted.sizeInBytes()
+
+    def shutdown(self, wait=True):
+        self.cancelPending()
+        if hasattr(self, "_pool"):
+            self._pool.shutdown(wait=wait)
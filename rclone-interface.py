@@ -1,4 +1,5 @@
 import lib.rclone as rclone
+from lib import remoteimage, remoteorganizer
 import tempfile
 from pathlib import Path
 configString = """[DriveUC3M]
@@ -14,14 +15,22 @@ configFile = Path(tempFolder.name,"config.txt")
 with open(configFile, "w") as confFile:
     confFile.write(configString)
 
-rcloneHandler = rclone.RCloneWrapper(configString)
+rcloneHandler = rclone.RCloneWrapper(configString, session=True)
 
 def analyzeFromRClone(url, RCloneHandler):
-    with tempfile.NamedTemporaryFile(mode="wb",delete=True, dir=tempFolder.name) as tempFile:
-        RCloneHandler.copy(url, tempFolder.name)
-        print(tempFolder.name)
-        #tempFile.write(data)
-        input("waiting")
+    # Only the header blocks of the picture are transferred
+    NEF = remoteimage.RemoteNEFImage(url, RCloneHandler)
+    try:
+        print(NEF.relocatePath("", ["capyear", "capmonth", "capday", "capdevice"]))
+    except ValueError as err:
+        print(format(err))
+    print(f"{NEF.bytesRead} bytes read")
+    NEF.close()
+
+def organizeFromRClone(root, outputRoot, RCloneHandler, move=True):
+    # Metadata through ranged reads, pictures moved server-side
+    organizer = remoteorganizer.RemoteOrganizer(RCloneHandler, outputRoot, move=move)
+    print(organizer.organize(root))
 
 analyzeFromRClone("DriveUC3M:00 Colocar/01 Multimedia sin organizar/2001/04/28/desconocido/vcm_s_kf_repr_832x624.jpg",rcloneHandler)
 # def analyzePicture(self,url):
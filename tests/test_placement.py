@@ -0,0 +1,75 @@
+"""
+Tests of lib/placement.py.
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import errno
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from lib import placement
+
+
+class PlacementTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.folder.name, "sorted")
+        os.makedirs(self.output)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write(self, relativePath, content):
+        fullPath = os.path.join(self.folder.name, relativePath)
+        os.makedirs(os.path.dirname(fullPath), exist_ok=True)
+        with open(fullPath, "wb") as picture:
+            picture.write(content)
+        return fullPath
+
+    def read(self, fullPath):
+        with open(fullPath, "rb") as picture:
+            return picture.read()
+
+    def test_existing_destination_is_kept(self):
+        destination = self.write("sorted/DSC_0001.NEF", b"kept")
+        for mode in placement.PLACEMENT_MODES:
+            source = self.write("card/DSC_0001.NEF", b"new")
+            with self.assertRaises(FileExistsError, msg=mode):
+                placement.placeFile(source, destination, mode)
+            self.assertEqual(self.read(destination), b"kept", mode)
+            self.assertTrue(os.path.exists(source), mode)
+
+    def test_same_names_get_free_names(self):
+        summary = placement.PlacementSummary()
+        placed = []
+        for card, content in [("card1", b"first"), ("card2", b"second")]:
+            source = self.write(f"{card}/DSC_0001.NEF", content)
+            placed.append(placement.placeUnique(source, self.output, "move", summary))
+            self.assertFalse(os.path.exists(source))
+        self.assertEqual([os.path.basename(destination) for destination, _ in placed],
+                         ["DSC_0001.NEF", "DSC_0001_1.NEF"])
+        self.assertEqual([self.read(destination) for destination, _ in placed], [b"first", b"second"])
+        self.assertEqual(summary.files["move"], 2)
+
+    def test_copied_move_counts_copied_bytes(self):
+        summary = placement.PlacementSummary()
+        source = self.write("card/DSC_0001.NEF", b"12345")
+        # Hardlinks failing (as across devices) make moves copy
+        with mock.patch("os.link", side_effect=OSError(errno.EXDEV, "Invalid cross-device link")):
+            placement.placeFile(source, os.path.join(self.output, "DSC_0001.NEF"), "move", summary)
+        self.assertEqual((summary.files["move"], summary.bytes["copied"], summary.bytes["moved"]), (1, 5, 0))
+
+    def test_identical_picture_is_not_duplicated(self):
+        source = self.write("card/DSC_0001.NEF", b"same")
+        placement.placeUnique(source, self.output, "copy")
+        self.assertEqual(placement.placeUnique(source, self.output, "copy"),
+                         (os.path.join(self.output, "DSC_0001.NEF"), None))
+        self.assertEqual(os.listdir(self.output), ["DSC_0001.NEF"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Tests of lib/remoteorganizer.py against the stand-in rclone rcd of
+test_rclone.
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import os
+import struct
+import tempfile
+import unittest
+
+from lib import rclone, remoteorganizer
+from tests.test_rclone import StandInRCD
+
+
+def tiffBytes(model, dateTimeOriginal):
+    """
+    Returns a little-endian TIFF whose IFD0 only holds Model and
+    DateTimeOriginal.
+    """
+    values = [(272, model.encode()+b"\x00"), (36867, dateTimeOriginal.encode()+b"\x00")]
+    valuesOffset = 8+2+len(values)*12+4
+    entries, data = b"", b""
+    for tag, value in values:
+        entries += struct.pack("<HHLL", tag, 2, len(value), valuesOffset+len(data))
+        data += value
+    return b"II*\x00"+struct.pack("<L", 8)+struct.pack("<H", len(values))+entries+struct.pack("<L", 0)+data
+
+
+class RemoteOrganizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.server = StandInRCD(self.folder.name)
+        self.wrapper = rclone.RCloneWrapper("", url=self.server.url)
+
+    def tearDown(self):
+        self.wrapper.close()
+        self.wrapper.tempFolder.cleanup()
+        self.server.shutdown()
+        self.server.server_close()
+        self.folder.cleanup()
+
+    def write(self, relativePath, content):
+        fullPath = os.path.join(self.folder.name, relativePath)
+        os.makedirs(os.path.dirname(fullPath), exist_ok=True)
+        with open(fullPath, "wb") as picture:
+            picture.write(content)
+
+    def read(self, relativePath):
+        with open(os.path.join(self.folder.name, relativePath), "rb") as picture:
+            return picture.read()
+
+    def test_name_clashes_get_free_names(self):
+        pictures = {name: tiffBytes("NIKON D750", "2020:09:10 06:00:02")+name.encode()
+                    for name in ["dir/a.nef", "dir/sub/a.nef", "dir/sub/b.nef"]}
+        for name, content in pictures.items():
+            self.write(name, content)
+        # Already in the output tree, not part of the run
+        self.write("sorted/2020/09/10/NIKON D750/b.nef", b"kept")
+        counters = remoteorganizer.RemoteOrganizer(self.wrapper, "fake:sorted").organize("fake:dir")
+        self.assertEqual((counters["moved"], counters["renamed"], counters["failed"]), (3, 2, 0))
+        organized = os.listdir(os.path.join(self.folder.name, "sorted/2020/09/10/NIKON D750"))
+        self.assertEqual(sorted(organized), ["a.nef", "a_1.nef", "b.nef", "b_1.nef"])
+        self.assertEqual(self.read("sorted/2020/09/10/NIKON D750/b.nef"), b"kept")
+        self.assertEqual(self.read("sorted/2020/09/10/NIKON D750/b_1.nef"), pictures["dir/sub/b.nef"])
+        self.assertEqual(set(self.read(f"sorted/2020/09/10/NIKON D750/{name}") for name in ["a.nef", "a_1.nef"]),
+                         set([pictures["dir/a.nef"], pictures["dir/sub/a.nef"]]))
+
+    def test_organized_pictures_stay(self):
+        self.write("sorted/2020/09/10/NIKON D750/a_1.nef", tiffBytes("NIKON D750", "2020:09:10 06:00:02"))
+        counters = remoteorganizer.RemoteOrganizer(self.wrapper, "fake:sorted").organize("fake:sorted")
+        self.assertEqual((counters["organized"], counters["moved"]), (1, 0))
+
+    def test_bare_remote_output_root(self):
+        organized = tiffBytes("NIKON D750", "2020:09:10 06:00:02")
+        self.write("2020/09/10/NIKON D750/a.nef", organized)
+        self.write("card/a.nef", organized+b"new")
+        counters = remoteorganizer.RemoteOrganizer(self.wrapper, "fake:").organize("fake:")
+        self.assertEqual((counters["organized"], counters["moved"], counters["renamed"]), (1, 1, 1))
+        self.assertEqual(self.read("2020/09/10/NIKON D750/a.nef"), organized)
+        self.assertEqual(self.read("2020/09/10/NIKON D750/a_1.nef"), organized+b"new")
+
+
+if __name__ == "__main__":
+    unittest.main()
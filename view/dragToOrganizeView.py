@@ -1,89 +1,122 @@
-from PyQt5.QtWidgets import QWidget
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QProgressBar, QPushButton, QListWidget, QListWidgetItem, QListView
+from PyQt5.QtCore import Qt, pyqtSignal, QSize, QTimer
+from PyQt5.QtGui import QIcon, QPixmap
 import CommonVariables
 import os
-from dev import tiffreader
-import concurrent.futures
+from lib import organizer, placement, thumbnails
 import time
-import json
-import shutil
-from pathlib import Path
 
 class dragToOrganizeView(QWidget):
+    progressChanged = pyqtSignal(dict)
+
     def __init__(self):
         super().__init__()
         self.resize(CommonVariables.desktopSize*0.5)
         self.move((CommonVariables.desktopSize.width()-self.width())/2,
                     (CommonVariables.desktopSize.height()-self.height())/2)
         self.setAcceptDrops(True)
-        
+        self.configureLayout()
+        self.progressChanged.connect(self.showProgress)
+        self.placementSummary = placement.PlacementSummary()
+        self.scheduler = organizer.OrganizerScheduler(
+            self.placePicture, progressCallback=self.progressChanged.emit)
+        self.thumbnails = thumbnails.ThumbnailCache()
+        self.thumbnails.thumbnailReady.connect(self.showThumbnail)
+        self.thumbnailItems = {}
+
+    def configureLayout(self):
+        self.dropLabel = QLabel("Drop pictures here to organize them")
+        self.dropLabel.setAlignment(Qt.AlignCenter)
+        self.progressBar = QProgressBar()
+        self.progressBar.hide()
+        self.progressLabel = QLabel()
+        self.cancelButton = QPushButton("Cancel")
+        self.cancelButton.setEnabled(False)
+        self.cancelButton.clicked.connect(self.cancel)
+        self.thumbnailList = QListWidget()
+        self.thumbnailList.setViewMode(QListView.IconMode)
+        self.thumbnailList.setResizeMode(QListView.Adjust)
+        self.thumbnailList.setUniformItemSizes(True)
+        self.thumbnailList.setIconSize(QSize(CommonVariables.thumbnailSize, CommonVariables.thumbnailSize))
+        self.thumbnailList.hide()
+        # Thumbnails are only requested for the visible items, once scrolling settles
+        self.thumbnailTimer = QTimer(self)
+        self.thumbnailTimer.setSingleShot(True)
+        self.thumbnailTimer.setInterval(50)
+        self.thumbnailTimer.timeout.connect(self.requestVisibleThumbnails)
+        self.thumbnailList.verticalScrollBar().valueChanged.connect(self.thumbnailTimer.start)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.dropLabel, 1)
+        layout.addWidget(self.thumbnailList, 4)
+        layout.addWidget(self.progressBar)
+        layout.addWidget(self.progressLabel)
+        layout.addWidget(self.cancelButton)
+
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+
     def dropEvent(self, event):
-        t = time.time()
-        _ = concurrent.futures.ThreadPoolExecutor().submit(self.analyzeSetOfPictures, [event.mimeData().urls(),t])
-                             
-        
-        # total = len(event.mimeData().urls())
-        # each = int(total/10)
-        # first = event.mimeData().urls()[0:each]
-        # del event.mimeData().urls()[0:each]
-        # second = event.mimeData().urls()[0:each]
-        # del event.mimeData().urls()[0:each]
-        # third = event.mimeData().urls()[0:each]
-        # del event.mimeData().urls()[0:each]
-        # forth = event.mimeData().urls()[0:each]
-        # del event.mimeData().urls()[0:each]
-        # fifth = event.mimeData().urls()
-        # with concurrent.futures.ProcessPoolExecutor(max_workers=10) as executor:
+        imagePaths = [url.toLocalFile() for url in event.mimeData().urls()]
+        self.scheduler.submit(imagePaths)
+        self.addThumbnails(imagePaths)
+        self.progressBar.show()
+        self.cancelButton.setEnabled(True)
 
-        #     executor.submit(
-        #     {self.analyzePicture(url) for url in first}
-        #     )
-        #     executor.submit(
-        #     {self.analyzePicture(url) for url in second}
-        #     )
-        #     executor.submit(
-        #     {self.analyzePicture(url) for url in third}
-        #     )
-        #     executor.submit(
-        #     {self.analyzePicture(url) for url in forth}
-        #     )
-        #     executor.submit(
-        #     {self.analyzePicture(url) for url in fifth}
-        #     )
+    def cancel(self):
+        self.cancelButton.setEnabled(False)
+        self.scheduler.cancel()
 
-                             
-        # print(f'Time for multiprocessing processing: {time.time() - t}')
+    def showProgress(self, progress):
+        self.progressBar.setMaximum(progress["total"])
+        self.progressBar.setValue(progress["done"])
+        eta = "--:--:--" if progress["eta"] == None else time.strftime("%H:%M:%S", time.gmtime(progress["eta"]))
+        self.progressLabel.setText(
+            f"{progress['done']}/{progress['total']} files, "
+            f"{progress['filesPerSecond']:.1f} files/s, {progress['mbPerSecond']:.1f} MB/s, ETA {eta}\n"
+            f"{progress['failed']} failed, {progress['skipped']} skipped, {progress['cancelled']} cancelled, "
+            f"{progress['resumed']} already done, "
+            f"parse processes {progress['parseLoad']:.0%} busy, copy threads {progress['copyLoad']:.0%} busy\n"
+            f"{self.placementSummary.report()}")
+        if progress["finished"]:
+            self.cancelButton.setEnabled(False)
 
-        # print("---------------------------------------------------------------")
+    def addThumbnails(self, imagePaths):
+        for imagePath in imagePaths:
+            if not imagePath in self.thumbnailItems:
+                item = QListWidgetItem(os.path.basename(imagePath))
+                item.setSizeHint(QSize(CommonVariables.thumbnailSize+16, CommonVariables.thumbnailSize+32))
+                self.thumbnailList.addItem(item)
+                self.thumbnailItems[imagePath] = item
+        self.thumbnailList.show()
+        self.thumbnailTimer.start()
 
-    def analyzeSetOfPictures(self,kargs):
-        urls = kargs [0]
-        t = kargs[1]
-        # print(f'Thread started: {self}')
-        for url in urls:
-            self.analyzePicture(url)
-        # print(f'Time for multithreading processing: {time.time() - t}')
+    def requestVisibleThumbnails(self):
+        self.thumbnails.cancelPending()
+        viewport = self.thumbnailList.viewport().rect()
+        for imagePath, item in self.thumbnailItems.items():
+            if item.icon().isNull() and self.thumbnailList.visualItemRect(item).intersects(viewport):
+                thumbnail = self.thumbnails.request(imagePath)
+                if thumbnail != None:
+                    self.showThumbnail(imagePath, thumbnail)
 
+    def showThumbnail(self, imagePath, thumbnail):
+        if imagePath in self.thumbnailItems and not thumbnail.isNull():
+            self.thumbnailItems[imagePath].setIcon(QIcon(QPixmap.fromImage(thumbnail)))
 
-    def analyzePicture(self,url):
-        path = Path(url.path()[1:])
-        try:
-            NEF = tiffreader.NEFImage(path)
-        except ValueError as err:
-            # print(format(err))
-            return
-        relPath = NEF.relocatePath(os.path.dirname(NEF.imagePath), ["capyear", "capmonth", "capday", "capdevice"])
-        self.createDir(relPath)
-        relFile = os.path.join(relPath,NEF.fileName)
-        print(relFile)
-        shutil.copy2(NEF.imagePath, relFile)
-        # if not hasattr(NEF, "jsonPath"):
-        #     NEF.createJSON(os.path.join(os.path.dirname(NEF.imagePath),"json"))
-        # print(relPath)
+    def closeEvent(self, event):
+        self.scheduler.cancel()
+        self.scheduler.shutdown(wait=False)
+        self.thumbnails.shutdown(wait=False)
+        super().closeEvent(event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.thumbnailItems:
+            self.thumbnailTimer.start()
 
-    def createDir(self,path):
-        splitted = path.split("/")
-        for i in range (3,len(splitted)):
-            newPath=""
-            for split in splitted[0:i]:
-                newPath = os.path.join(newPath,split)
-            if not os.path.isdir(newPath): os.mkdir(newPath)
\ No newline at end of file
+    def placePicture(self, imagePath, relPath):
+        # Pictures sharing a name get name_N ones, never replacing each other
+        relFile, _ = placement.placeUnique(imagePath, relPath, CommonVariables.placementMode,
+                                           self.placementSummary)
+        print(relFile)